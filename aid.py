@@ -1,45 +1,165 @@
 import requests, json, logging
-from bs4 import BeautifulSoup
-import os 
+import datetime
+import itertools
+import os
+import re
+import threading
+from dateutil.relativedelta import relativedelta
 
 logger = logging.getLogger(__name__)
 
+def iter_json_array(chunks, key: str):
+    # yields the elements of the top-level array <key> from a stream of text
+    # chunks without holding the whole document in memory
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    chunks = iter(chunks)
+    exhausted = False
+
+    def more() -> bool:
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    while True:
+        match = start.search(buffer, pos)
+        if match:
+            pos = match.end()
+            break
+        # keep a tail in case the key is split across chunks
+        pos = max(0, len(buffer) - len(key) - 64)
+        if not more():
+            raise ValueError("no %s array in response" % key)
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer):
+            if not more():
+                raise ValueError("truncated %s array in response" % key)
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            (element, end) = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if exhausted or not more():
+                raise
+            continue
+        if end >= len(buffer) and not exhausted:
+            # a number at the end of the buffer may continue in the next chunk
+            if more():
+                continue
+        pos = end
+        yield element
+
 class AID():
-    def __init__(self, tenant, user, pw):
+    _clients = dict()
+    _lock = threading.Lock()
+    url = "https://www.aircraft-info.de"
+
+    def client(tenant, user, pw, timeout=None, url=None):
+        # one long-lived client (and connection pool) per tenant, reused
+        # across refreshes
+        with AID._lock:
+            aid = AID._clients.get(tenant)
+            if aid is None or aid.user != user or aid.pw != pw or aid.url != (url or AID.url):
+                aid = AID(tenant, user, pw, timeout=timeout, url=url)
+                AID._clients[tenant] = aid
+            aid.timeout = timeout
+            return aid
+
+    def __init__(self, tenant, user, pw, timeout=None, url=None):
         self.session_file = "data/" + tenant + ".json"
-        self.base_url = "https://www.aircraft-info.de/" + tenant
+        self.url = url or AID.url
+        self.base_url = self.url.rstrip("/") + "/" + tenant
         self.user = user
         self.pw = pw
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.logins = 0
         try:
             with open(self.session_file) as f:
                 session = json.load(f)
-            self.cookies = session["cookies"]
+            self.session.cookies.update(session["cookies"])
         except Exception as e:
-            self.cookies = {}
-        self.login()
+            pass
+        # no login here: the stored cookies are tried first and login() only
+        # runs when a data call comes back with the login page
+
+    @property
+    def cookies(self) -> dict:
+        return self.session.cookies.get_dict()
 
     def save_session(self):
         if not os.path.exists("data/"):
             os.mkdir("data")
-            
+
         with open(self.session_file, 'w') as f:
             f.write(json.dumps({"cookies": self.cookies}))
 
+    def windows(since: datetime.date, until: datetime.date, months: int = 12) -> list:
+        # consecutive, non-overlapping (since, until) date ranges for the API
+        windows = list()
+        start = since
+        while start <= until:
+            end = min(start + relativedelta(months=months) - relativedelta(days=1), until)
+            windows.append((start.strftime("%d.%m.%Y"), end.strftime("%d.%m.%Y")))
+            start = end + relativedelta(days=1)
+        return windows
+
+    def login_required(self, r, head: str) -> bool:
+        if r.status_code in (401, 403):
+            return True
+        if "site_login.php" in r.url:
+            return True
+        # data calls answer JSON, anything else is checked for the login page
+        if head.lstrip().startswith(("{", "[")):
+            return False
+        title = re.search(r"<title>(.*?)</title>", head, re.IGNORECASE | re.DOTALL)
+        return title is not None and "Login Page" in title.group(1)
+
+    def stream(self, url: str):
+        # streamed GET, re-login and retry once if the session has expired;
+        # returns the response and an iterator over its text chunks
+        for attempt in range(2):
+            logins = self.logins
+            r = self.session.get(url, timeout=self.timeout, stream=True)
+            r.encoding = r.encoding or "utf-8"
+            chunks = r.iter_content(chunk_size=64 * 1024, decode_unicode=True)
+            head = next(chunks, "")
+            if attempt == 0 and self.login_required(r, head):
+                r.close()
+                with self.lock:
+                    # parallel requests only log in once
+                    if self.logins == logins:
+                        self.login()
+                continue
+            return (r, itertools.chain([head], chunks))
+
+    def csrf_token(self, html: str) -> str:
+        for tag in re.findall(r"<input\b[^>]*>", html, re.IGNORECASE):
+            if re.search(r"name=[\"']_csrf_token[\"']", tag):
+                value = re.search(r"value=[\"']([^\"']*)[\"']", tag)
+                if value:
+                    return value.group(1)
+        raise ValueError("no _csrf_token on %s/site_login.php" % self.base_url)
+
     def login(self):
-        # test if login required
-        r = requests.get("%s/dashboards/mydashboard.php" % self.base_url, cookies=self.cookies)
-        self.cookies = r.cookies.get_dict()
-        soup = BeautifulSoup(r.text, 'html.parser')
-        if not "Login Page" in str(soup.title):
-            logger.debug('Login not required')
-            return
+        logger.debug('Login required')
+        self.session.cookies.clear()
 
         # GET login form
-        r = requests.get("%s/site_login.php" % self.base_url, cookies=self.cookies)
-        self.cookies = r.cookies.get_dict()
-        soup = BeautifulSoup(r.text, 'html.parser')
-        loginform = soup.find("form")
-        _csrf_token = loginform.find("input", {"type": "hidden", "name": "_csrf_token"})["value"]
+        r = self.session.get("%s/site_login.php" % self.base_url, timeout=self.timeout)
+        _csrf_token = self.csrf_token(r.text)
 
         # craft login POST request
         login_url = "%s/site_logon.php" % self.base_url
@@ -52,14 +172,19 @@ class AID():
             '_pass': self.pw
         }
 
-        r = requests.post(login_url, data=data, cookies=self.cookies)
-        self.cookies = r.cookies.get_dict()
+        r = self.session.post(login_url, data=data, timeout=self.timeout)
+        self.logins += 1
         self.save_session()
 
+    def iter_flightlog(self, since, until):
+        req_url="%s/mydata/flightlog_exec.php?_since_date=%s&_until_date=%s" % (self.base_url, since, until)
+        (r, chunks) = self.stream(req_url)
+        try:
+            if r.status_code != 200:
+                raise requests.HTTPError("%s answered %d for %s - %s" % (self.base_url, r.status_code, since, until), response=r)
+            yield from iter_json_array(chunks, "data")
+        finally:
+            r.close()
+
     def get_flightlog(self, since, until):
-        req_url="%s/mydata/flightlog_exec.php?_since_date=%s&_until_date=%s" % (self.base_url, since, until) 
-        r = requests.get(req_url, cookies=self.cookies)
-        assert(r.status_code == 200)
-        ret = json.loads(r.text)
-        return ret
-        
\ No newline at end of file
+        return {"data": list(self.iter_flightlog(since, until))}
@@ -1,4 +1,35 @@
+import logging
+import os
+import pickle
+import threading
+
 import airportsdata
+from astral.sun import Observer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+class Airport():
+    __slots__ = ("icao", "name", "lat", "lon", "elevation", "_observer")
+
+    def __init__(self, icao: str, name: str, lat: float, lon: float, elevation: float):
+        self.icao = icao
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.elevation = elevation  # metres
+        self._observer = None
+
+    @property
+    def observer(self) -> Observer:
+        if self._observer is None:
+            self._observer = Observer(self.lat, self.lon, self.elevation)
+        return self._observer
 
 class Airports(object):
     _instance = None
@@ -10,5 +41,65 @@ class Airports(object):
     def instance(cls):
         if cls._instance is None:
             cls._instance = cls.__new__(cls)
-            cls._instance.airports = airportsdata.load()
-        return cls._instance
\ No newline at end of file
+            cls._instance.init()
+        return cls._instance
+
+    def init(self):
+        # only airports that were asked for are kept; None marks unknown codes
+        self.lock = threading.Lock()
+        self.airports = dict()
+        self.tablefilename = "data/airports.pickle"
+
+    def source(self) -> str:
+        return os.path.join(os.path.dirname(airportsdata.__file__), "airports.csv")
+
+    def version(self) -> tuple:
+        stat = os.stat(self.source())
+        return (airportsdata.__version__, stat.st_mtime_ns, stat.st_size)
+
+    def build_table(self) -> dict:
+        # icao -> (name, lat, lon, elevation in metres), written once per
+        # airportsdata release and unpickled much faster than the csv is parsed
+        table = {icao: (a['name'], a['lat'], a['lon'], a['elevation'] / 3.28084) for icao, a in airportsdata.load().items()}
+        try:
+            if not os.path.exists("data/"):
+                os.mkdir("data")
+            tmpfilename = self.tablefilename + ".tmp"
+            with open(tmpfilename, "wb") as f:
+                pickle.dump({"version": self.version(), "airports": table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfilename, self.tablefilename)
+            logger.info("airport table built (%d airports)." % len(table))
+        except OSError as e:
+            logger.warning("could not write airport table: %s" % e)
+        return table
+
+    def table(self) -> dict:
+        try:
+            with open(self.tablefilename, "rb") as f:
+                table = pickle.load(f)
+            if table["version"] == self.version():
+                return table["airports"]
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+            pass
+        return self.build_table()
+
+    def load(self, codes):
+        # the full table is only held while the missing codes are copied out
+        with self.lock:
+            missing = {code for code in codes if not code in self.airports}
+            if not missing:
+                return
+            table = self.table()
+            for code in missing:
+                row = table.get(code)
+                self.airports[code] = Airport(code, *row) if row else None
+
+    def get(self, icao: str) -> Airport:
+        if not icao in self.airports:
+            self.load([icao])
+        return self.airports[icao]
+
+    def subset(self, codes) -> dict:
+        # just the airports a page refers to, for the template context
+        self.load(codes)
+        return {code: self.airports[code] for code in codes if self.airports[code] is not None}
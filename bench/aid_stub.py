@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# Local stand-in for aircraft-info.de: the login flow (site_login.php with a
+# _csrf_token, site_logon.php, session cookie) and mydata/flightlog_exec.php
+# answering synthetic flights for the requested date window (paged with the
+# DataTables start/length/draw parameters, all rows by default), with
+# configurable latency, payload size, session expiry and error rate.
+#
+#   python bench/aid_stub.py --port 8001 --latency 0.05 --session-ttl 60
+#
+# and set "aid_url": "http://127.0.0.1:8001" in config.json. GET /_stats
+# returns the request counters.
+import argparse
+import datetime
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate import flight
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Login Page</title></head><body>
+<form method="post" action="site_logon.php">
+<input type="hidden" name="_csrf_token" value="%s">
+<input type="text" name="_login"><input type="password" name="_pass">
+</form></body></html>"""
+
+class Stub(object):
+    def __init__(self, latency: float = 0, jitter: float = 0, flights_per_day: float = 1, session_ttl: float = 3600,
+                 error_rate: float = 0, users: dict = None, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.flights_per_day = flights_per_day
+        self.session_ttl = session_ttl
+        self.error_rate = error_rate
+        self.users = users          # username -> password, None accepts any
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.sessions = dict()      # session id -> {"csrf": token, "user": name, "expires": time}
+        self.stats = {"login_pages": 0, "logons": 0, "failed_logons": 0, "data_requests": 0, "expired": 0, "errors": 0, "flights": 0, "bytes": 0}
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.stats[key] += n
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def flights(self, tenant: str, since: datetime.date, until: datetime.date) -> list:
+        # deterministic per (tenant, day), so overlapping windows return the
+        # same flights with the same ids
+        flights = list()
+        day = since
+        while day <= until:
+            rng = random.Random("%s-%s-%s" % (self.seed, tenant, day.toordinal()))
+            count = int(self.flights_per_day) + (1 if rng.random() < self.flights_per_day % 1 else 0)
+            for i in range(count):
+                date = datetime.datetime(day.year, day.month, day.day, rng.randint(6, 19), rng.choice([0, 15, 30, 45]))
+                flights.append(flight(rng, day.toordinal() * 100 + i, date))
+            day += datetime.timedelta(days=1)
+        return flights
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body: bytes = b"", content_type: str = "text/html; charset=utf-8", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def session(self) -> tuple:
+        for cookie in self.headers.get_all("Cookie") or list():
+            for part in cookie.split(";"):
+                (name, _, value) = part.strip().partition("=")
+                if name == "PHPSESSID":
+                    return (value, self.server.stub.sessions.get(value))
+        return (None, None)
+
+    def route(self) -> tuple:
+        # /<tenant>/<page>
+        url = urlsplit(self.path)
+        (_, tenant, page) = (url.path.split("/", 2) + ["", ""])[:3]
+        return (tenant, page, parse_qs(url.query))
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.delay()
+        if self.path == "/_stats":
+            return self.send(200, json.dumps(stub.stats).encode(), "application/json")
+        (tenant, page, query) = self.route()
+        if page == "site_login.php":
+            stub.count("login_pages")
+            sid = secrets.token_hex(16)
+            csrf = secrets.token_hex(16)
+            with stub.lock:
+                stub.sessions[sid] = {"csrf": csrf, "user": None, "expires": 0}
+            return self.send(200, (LOGIN_PAGE % csrf).encode(), headers={"Set-Cookie": "PHPSESSID=%s; Path=/" % sid})
+        if page == "mydata/flightlog_exec.php":
+            stub.count("data_requests")
+            (_, session) = self.session()
+            if session is None or session["user"] is None or session["expires"] < time.time():
+                if session is not None and session["user"] is not None:
+                    stub.count("expired")
+                return self.send(302, headers={"Location": "/%s/site_login.php" % tenant})
+            if stub.error_rate and stub.rng.random() < stub.error_rate:
+                stub.count("errors")
+                return self.send(500, b"Internal Server Error")
+            try:
+                since = datetime.datetime.strptime(query["_since_date"][0], "%d.%m.%Y").date()
+                until = datetime.datetime.strptime(query["_until_date"][0], "%d.%m.%Y").date()
+                # DataTables paging: start/length (-1 for all rows), draw is echoed
+                start = int(query.get("start", ["0"])[0])
+                length = int(query.get("length", ["-1"])[0])
+                draw = int(query.get("draw", ["1"])[0])
+            except (KeyError, ValueError):
+                return self.send(400, b"Bad Request")
+            flights = stub.flights(tenant, since, until)
+            total = len(flights)
+            flights = flights[start:] if length < 0 else flights[start:start + length]
+            body = json.dumps({"draw": draw, "recordsTotal": total, "recordsFiltered": total, "data": flights}).encode()
+            stub.count("flights", len(flights))
+            stub.count("bytes", len(body))
+            return self.send(200, body, "application/json")
+        if page in ("", "index.php"):
+            return self.send(200, b"<html><head><title>aircraft-info</title></head><body></body></html>")
+        return self.send(404, b"Not Found")
+
+    def do_POST(self):
+        stub = self.server.stub
+        stub.delay()
+        (tenant, page, _) = self.route()
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode())
+        if page != "site_logon.php":
+            return self.send(404, b"Not Found")
+        (sid, session) = self.session()
+        user = form.get("_login", [""])[0]
+        valid = stub.users is None or stub.users.get(user) == form.get("_pass", [""])[0]
+        if session is None or form.get("_csrf_token", [""])[0] != session["csrf"] or not valid:
+            stub.count("failed_logons")
+            return self.send(302, headers={"Location": "/%s/site_login.php" % tenant})
+        stub.count("logons")
+        with stub.lock:
+            session["user"] = user
+            session["expires"] = time.time() + stub.session_ttl
+        return self.send(302, headers={"Location": "/%s/index.php" % tenant})
+
+def serve(port: int = 8001, host: str = "127.0.0.1", **kwargs) -> ThreadingHTTPServer:
+    # returns the running server, serve_forever() runs in a daemon thread
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stub = Stub(**kwargs)
+    threading.Thread(target=server.serve_forever, name="aid-stub", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the aircraft-info.de endpoints used by aid.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0, help="+/- seconds around the latency")
+    parser.add_argument("--flights-per-day", type=float, default=1, help="payload size, flights per day of the window")
+    parser.add_argument("--session-ttl", type=float, default=3600, help="seconds until a login expires")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of data requests answered with 500")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    server = serve(args.port, args.host, latency=args.latency, jitter=args.jitter, flights_per_day=args.flights_per_day,
+                   session_ttl=args.session_ttl, error_rate=args.error_rate, seed=args.seed)
+    print("AID stub on http://%s:%d" % server.server_address, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Synthetic flightlogs for benchmarking: writes data/flightlog_<tenant>.dat,
+# data/metadata.dat and a config.json into a directory.
+#
+#   python bench/generate.py /tmp/bench --flights 100000 --tenants 3
+import argparse
+import datetime
+import json
+import os
+import random
+
+# real ICAO codes, weighted towards a home base like a club log
+HOME = "EDVE"
+AIRPORTS = ["EDVE", "EDDH", "EDDV", "EDVK", "EDXW", "EDHL", "EDDW", "EDVM", "EDVY", "EDVH", "EDVW", "EDLE",
+            "EDFE", "EDMA", "EDNY", "EDTY", "EDWI", "EDHI", "EDAH", "EDBH", "EDXF", "EDQM", "EDWE", "EDWS",
+            "LOWZ", "EHTE", "EKSB", "ESMS"]
+AIRCRAFT = [("C172", "D-EFGH"), ("C172", "D-EFGI"), ("PA28", "D-EABC"), ("DA40", "D-EDAA"), ("DA40", "D-EDAB"),
+            ("C152", "D-EKLM"), ("SR20", "D-ESRA"), ("DR40", "D-EROB")]
+INSTRUCTORS = ["Meyer 12", "Schulz 7", "Becker 31", "Hoffmann 4", "Koch 18"]
+PAX = ["Anna", "Bob", "Clara", "David", "Eva", "Felix", "Greta", "Hans"]
+PRICECATS = ["Charterflug", "Schulungsflug", "Check-/Einweisungs-/&Uuml;bungsflug", "Charterflug mit Kurzfristbuchungsrabatt"]
+MYSELF = "Lastname"
+
+def hhmm(minutes: int) -> str:
+    return "%d:%02d" % divmod(minutes, 60)
+
+def crew(rng, pricecat: str) -> str:
+    if pricecat == "Schulungsflug" or pricecat.startswith("Check"):
+        return rng.choice(["<b>%s</b> / %s", "%s / <b>%s</b>"]) % ((MYSELF, rng.choice(INSTRUCTORS)) if rng.random() < 0.5 else (rng.choice(INSTRUCTORS), MYSELF))
+    return rng.choice(["<b>%s</b>" % MYSELF, MYSELF])
+
+def flight(rng, flightid: int, date: datetime.datetime) -> dict:
+    (actype, callsign) = rng.choice(AIRCRAFT)
+    pricecat = rng.choice(PRICECATS)
+    blocktime = rng.randint(20, 240)
+    airtime = max(5, blocktime - rng.randint(5, 20))
+    blockoff = date
+    takeoff = blockoff + datetime.timedelta(minutes=(blocktime - airtime) // 2)
+    departure = HOME if rng.random() < 0.6 else rng.choice(AIRPORTS)
+    destination = HOME if rng.random() < 0.6 else rng.choice(AIRPORTS)
+    return {
+        "flightid": flightid,
+        "flightdate": {"sortval": int(date.timestamp())},
+        "actype": actype,
+        "callsign": callsign,
+        "crew": crew(rng, pricecat),
+        "departure": departure,
+        "destination": destination,
+        "takeoff": takeoff.strftime("%H:%M"),
+        "landing": (takeoff + datetime.timedelta(minutes=airtime)).strftime("%H:%M"),
+        "blockoff": blockoff.strftime("%H:%M"),
+        "blockon": (blockoff + datetime.timedelta(minutes=blocktime)).strftime("%H:%M"),
+        "landings": str(rng.choice([1, 1, 1, 2, 3, 5, 8])),
+        "airtime": hhmm(airtime),
+        "blocktime": hhmm(blocktime),
+        "pricecat": pricecat,
+    }
+
+def generate(directory: str, flights: int, tenants: int = 2, duplicates: float = 0.01, metadata: float = 0.1,
+             seed: int = 1, until: datetime.datetime = datetime.datetime(2026, 10, 1)) -> dict:
+    # flights are spread evenly over the tenants; every tenant numbers its
+    # flights from 1000 so numeric ids overlap across tenants, and a fraction
+    # of records is delivered twice within a file like repeated API windows
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    # about one flight a day per 1000 flights in the log, at most 40 years
+    days = min(40 * 365, max(365, flights // 3))
+    names = ["tenant%d" % i for i in range(tenants)]
+    metadata_entries = dict()
+    records = 0
+    for (t, name) in enumerate(names):
+        count = flights // tenants + (1 if t < flights % tenants else 0)
+        dates = sorted(until - datetime.timedelta(days=rng.random() * days) for _ in range(count))
+        data = list()
+        for (i, date) in enumerate(dates):
+            # daylight UTC block off times, late ones become night flights in winter
+            date = date.replace(hour=rng.randint(6, 19), minute=rng.choice([0, 15, 30, 45]), second=0, microsecond=0)
+            data.append(flight(rng, 1000 + i, date))
+            if rng.random() < metadata:
+                entry = {"comment": "Platzrunden" if rng.random() < 0.5 else "Ausflug"}
+                if rng.random() < 0.5:
+                    entry["pax"] = ",".join(rng.sample(PAX, rng.randint(1, 3)))
+                metadata_entries["%s-%d" % (name, 1000 + i)] = entry
+        data += [dict(f) for f in rng.sample(data, int(len(data) * duplicates))]
+        records += len(data)
+        with open(os.path.join(directory, "data", "flightlog_%s.dat" % name), "w") as f:
+            json.dump(data, f)
+    with open(os.path.join(directory, "data", "metadata.dat"), "w") as f:
+        json.dump(metadata_entries, f)
+    config = {
+        "tenants": [{"name": name, "username": "bench", "password": "bench"} for name in names],
+        "home": "Braunschweig Wolfsburg",
+        "myself": MYSELF,
+        "graph_workers": 0,
+    }
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f, indent=4)
+    return {"flights": flights, "tenants": tenants, "records": records, "metadata": len(metadata_entries)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic flightlogs")
+    parser.add_argument("directory")
+    parser.add_argument("--flights", type=int, default=1000)
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--duplicates", type=float, default=0.01, help="fraction of records repeated within a tenant file")
+    parser.add_argument("--metadata", type=float, default=0.1, help="fraction of flights with a comment or pax")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(generate(args.directory, args.flights, args.tenants, args.duplicates, args.metadata, args.seed)))
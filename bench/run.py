@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Benchmarks the flightlog hot paths and full HTTP requests on synthetic data
+# (see generate.py) and writes a JSON report. Every size runs in a fresh
+# process; "first" is the cold call, "median"/"min"/"max" cover the repeats.
+#
+#   python bench/run.py --sizes 100,1000,10000,100000 --output bench-report.json
+#   python bench/run.py --compare old.json new.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+
+sys.path.insert(0, BENCH)
+from generate import generate
+
+def measure(timings: dict, name: str, fn, repeat: int):
+    runs = list()
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    timings[name] = {"first": runs[0], "median": statistics.median(runs), "min": min(runs), "max": max(runs), "runs": len(runs)}
+    return result
+
+def child(args):
+    # runs inside the generated directory, with the repo modules importable
+    os.chdir(args.directory)
+    for name in ("templates", "static"):
+        if not os.path.exists(name):
+            os.symlink(os.path.join(REPO, name), name)
+    sys.path.insert(0, REPO)
+    import logging
+    logging.disable(logging.INFO)
+
+    timings = dict()
+    statuses = dict()
+    repeat = args.repeat
+
+    start = time.perf_counter()
+    from main import app
+    from config import Config
+    from fastapi.testclient import TestClient
+    from flightlog import FlightLog
+    from flighttable import FlightTable
+    from graph import render_bar
+    from night import Night
+    import series
+    timings["import"] = {"first": time.perf_counter() - start, "runs": 1}
+
+    tenants = Config.instance().getTenants()
+    flightlog = measure(timings, "FlightLog.virtual", lambda: FlightLog.virtual(tenants), repeat)
+    measure(timings, "FlightLog.file", lambda: FlightLog.file(tenants[0]["name"]), repeat)
+    FlightLog.cached(tenants)
+    measure(timings, "FlightLog.cached (hit)", lambda: FlightLog.cached(tenants), repeat)
+
+    def get_statistics():
+        flightlog.totals = None
+        flightlog.memo = dict()
+        return flightlog.get_statistics()
+    measure(timings, "FlightLog.get_statistics", get_statistics, repeat)
+    measure(timings, "FlightLog.get_flights_groupedby_month", lambda: flightlog.get_flights_groupedby_month(), repeat)
+    measure(timings, "FlightLog.get_flights_groupedby_person", lambda: flightlog.get_flights_groupedby_person(), repeat)
+
+    def is_night_cold():
+        Night.instance().dusks.clear()
+        return [Night.instance().is_night(f) for f in flightlog.flights]
+    measure(timings, "Night.is_night (cold)", is_night_cold, min(repeat, 3))
+    measure(timings, "Night.is_night", lambda: [Night.instance().is_night(f) for f in flightlog.flights], repeat)
+
+    (keys, values) = series.by_month(flightlog, "actype")
+    measure(timings, "render_bar", lambda: render_bar(keys, values, "Blocktime per aircraft type", xdates=True), min(repeat, 3))
+
+    if not args.no_http:
+        with TestClient(app) as client:
+            flightlog = FlightLog.cached(tenants)
+            middle = flightlog.flights[len(flightlog.flights) // 2]
+            (_, cursor) = flightlog.get_page(0, Config.instance().get("page_size") or 100)
+            urls = {
+                "GET /": "/",
+                "GET /rows?before=": "/rows?before=%s" % cursor if cursor else "/rows",
+                "GET /flight/{id}": "/flight/%s" % middle.getID(),
+                "GET /api/series/bt_ac": "/api/series/bt_ac",
+                "GET /api/series/other": "/api/series/other",
+                "GET /graph/bt_ac": "/graph/bt_ac",
+                "GET /graph/other": "/graph/other",
+                "GET /graph/airports": "/graph/airports",
+            }
+            for (name, url) in urls.items():
+                def get():
+                    r = client.get(url)
+                    statuses[name] = r.status_code
+                    return r
+                measure(timings, name, get, repeat)
+
+    # new flights beyond the generated ids, one batch per run
+    tenantlog = FlightLog.file(tenants[0]["name"])
+    template = dict(tenantlog.get_data()[0])
+    batches = iter(range(10 ** 9, 10 ** 9 + repeat * args.batch, args.batch))
+    def store():
+        first = next(batches)
+        return tenantlog.store([dict(template, flightid=first + i) for i in range(args.batch)])
+    flights_loaded = len(FlightLog.cached(tenants).flights)
+    measure(timings, "FlightLog.store (%d)" % args.batch, store, repeat)
+
+    return {
+        "numpy": FlightTable.available(),
+        "flights_loaded": flights_loaded,
+        "timings": timings,
+        "statuses": statuses,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run_size(args, flights: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="aid-bench-") as directory:
+        start = time.perf_counter()
+        result = generate(directory, flights, args.tenants, seed=args.seed)
+        result["generate_seconds"] = time.perf_counter() - start
+        command = [sys.executable, os.path.abspath(__file__), "--child", directory, "--repeat", str(args.repeat), "--batch", str(args.batch)]
+        if args.no_http:
+            command.append("--no-http")
+        try:
+            p = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            result["error"] = "timed out after %ds" % args.timeout
+            return result
+        if p.returncode != 0:
+            result["error"] = p.stderr.strip().splitlines()[-1] if p.stderr.strip() else "exit code %d" % p.returncode
+            return result
+        result.update(json.loads(p.stdout.strip().splitlines()[-1]))
+        return result
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(old: str, new: str):
+    # median ratio new/old per size and timing, < 1 is faster
+    with open(old) as f:
+        old = {r["flights"]: r for r in json.load(f)["results"]}
+    with open(new) as f:
+        new = {r["flights"]: r for r in json.load(f)["results"]}
+    print("%10s  %-42s %10s %10s %7s" % ("flights", "timing", "old", "new", "ratio"))
+    for flights in sorted(old.keys() & new.keys()):
+        for name, timing in new[flights].get("timings", dict()).items():
+            before = old[flights].get("timings", dict()).get(name)
+            if before is None:
+                continue
+            (a, b) = (before.get("median", before["first"]), timing.get("median", timing["first"]))
+            print("%10d  %-42s %9.4fs %9.4fs %6.2fx" % (flights, name, a, b, b / a if a else float("nan")))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the flightlog hot paths on synthetic data")
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="comma separated flight counts, e.g. up to 1000000")
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=100, help="flights per FlightLog.store call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=int, default=1800, help="seconds per size")
+    parser.add_argument("--no-http", action="store_true", help="skip the TestClient requests")
+    parser.add_argument("--output", default="bench-report.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--child", metavar="DIRECTORY", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.child:
+        args.directory = args.child
+        print(json.dumps(child(args)))
+        return
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tenants": args.tenants,
+        "repeat": args.repeat,
+        "results": list(),
+    }
+    for flights in [int(x) for x in args.sizes.split(",")]:
+        result = run_size(args, flights)
+        report["results"].append(result)
+        if "error" in result:
+            print("%10d flights: %s" % (flights, result["error"]), file=sys.stderr)
+        else:
+            slowest = max(result["timings"].items(), key=lambda item: item[1].get("median", item[1]["first"]))
+            print("%10d flights: peak rss %d MB, slowest %s %.3fs" % (flights, result["peak_rss_kb"] // 1024, slowest[0], slowest[1].get("median", slowest[1]["first"])), file=sys.stderr)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
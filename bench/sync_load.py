@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# Load test for the sync path: starts bench/aid_stub.py in its own process,
+# points N tenants at it and runs refresh_data() for a number of rounds (the
+# first one backfills the empty logs, later ones are incremental). Reports
+# throughput, request latency percentiles, logins and peak memory as JSON.
+#
+#   python bench/sync_load.py --tenants 8 --years 10 --latency 0.05 --session-ttl 5 --output sync-report.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_stub(args, port: int):
+    command = [sys.executable, os.path.join(BENCH, "aid_stub.py"), "--port", str(port), "--latency", str(args.latency),
+               "--jitter", str(args.jitter), "--flights-per-day", str(args.flights_per_day),
+               "--session-ttl", str(args.session_ttl), "--error-rate", str(args.error_rate)]
+    stub = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            stats(port)
+            return stub
+        except OSError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("AID stub did not start on port %d" % port)
+
+def stats(port: int) -> dict:
+    with urllib.request.urlopen("http://127.0.0.1:%d/_stats" % port, timeout=5) as r:
+        return json.load(r)
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+    return {"count": len(values), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": values[-1]}
+
+def run(args, directory: str, port: int) -> dict:
+    os.chdir(directory)
+    os.makedirs("data", exist_ok=True)
+    since = datetime.date.today() - datetime.timedelta(days=round(365.25 * args.years))
+    config = {
+        "tenants": [{"name": "tenant%d" % i, "username": "bench", "password": "bench"} for i in range(args.tenants)],
+        "home": "Braunschweig Wolfsburg",
+        "myself": "Lastname",
+        "aid_url": "http://127.0.0.1:%d" % port,
+        "backfill_since": since.strftime("%d.%m.%Y"),
+        "backfill_workers": args.backfill_workers,
+        "refresh_workers": args.refresh_workers,
+        "refresh_timeout": args.timeout,
+    }
+    with open("config.json", "w") as f:
+        json.dump(config, f)
+
+    sys.path.insert(0, REPO)
+    import logging
+    logging.disable(logging.INFO)
+    from aid import AID
+    from config import Config
+    from sync import Sync, refresh_data
+
+    # the shared per-tenant clients are created up front so every request
+    # can be timed (time to response headers) through a session hook
+    lock = threading.Lock()
+    latencies = list()
+    def record(r, *_, **__):
+        if "flightlog_exec.php" in r.url and not r.is_redirect:
+            with lock:
+                latencies.append(r.elapsed.total_seconds())
+    clients = list()
+    for tenant in Config.instance().getTenants():
+        aid = AID.client(tenant["name"], tenant["username"], tenant["password"], timeout=Sync.instance().timeout(), url=config["aid_url"])
+        aid.session.hooks["response"].append(record)
+        clients.append(aid)
+
+    rounds = list()
+    for n in range(args.rounds):
+        with lock:
+            latencies.clear()
+        logins = sum(aid.logins for aid in clients)
+        start = time.perf_counter()
+        results = refresh_data()
+        seconds = time.perf_counter() - start
+        added = sum(v for v in results.values() if isinstance(v, int))
+        errors = {name: "%s: %s" % (type(v).__name__, v) for name, v in results.items() if not isinstance(v, int)}
+        with lock:
+            requests = len(latencies)
+            latency = percentiles(latencies)
+        rounds.append({
+            "round": n + 1,
+            "kind": "backfill" if n == 0 else "incremental",
+            "seconds": seconds,
+            "flights_added": added,
+            "flights_per_second": added / seconds if seconds else None,
+            "requests": requests,
+            "requests_per_second": requests / seconds if seconds else None,
+            "latency": latency,
+            "logins": sum(aid.logins for aid in clients) - logins,
+            "errors": errors,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+        print("round %d: %d flights in %.2fs (%.0f/s), %d requests, %d errors" % (n + 1, added, seconds, added / seconds if seconds else 0, requests, len(errors)), file=sys.stderr)
+        if args.pause:
+            time.sleep(args.pause)
+    Sync.instance().executor.shutdown(wait=True)
+    return {"rounds": rounds, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test refresh_data() against the local AID stub")
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--years", type=int, default=5, help="history to backfill per tenant")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--pause", type=float, default=0, help="seconds between rounds, e.g. to let sessions expire")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--flights-per-day", type=float, default=1)
+    parser.add_argument("--session-ttl", type=float, default=3600)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--refresh-workers", type=int, default=4)
+    parser.add_argument("--backfill-workers", type=int, default=4)
+    parser.add_argument("--timeout", type=int, default=600, help="refresh_timeout in seconds")
+    parser.add_argument("--output", default="sync-report.json")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    port = free_port()
+    stub = start_stub(args, port)
+    try:
+        with tempfile.TemporaryDirectory(prefix="aid-sync-") as directory:
+            result = run(args, directory, port)
+            result["stub"] = stats(port)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        **result,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Time to first byte after a restart: starts uvicorn on synthetic data (see
+# generate.py), then times from process start until the port accepts
+# connections and until the first byte of each request, with and without
+# the startup warm-up.
+#
+#   python bench/ttfb.py --flights 10000 --delay 0,2 --output ttfb-report.json
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCH)
+
+sys.path.insert(0, BENCH)
+from generate import generate
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def first_byte(port: int, path: str, timeout: float = 600) -> tuple:
+    # (seconds until the status line arrived, status)
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        seconds = time.perf_counter() - start
+        response.read()
+        return (seconds, response.status)
+    finally:
+        connection.close()
+
+def start(directory: str, port: int, warmup: bool, workers: int):
+    with open(os.path.join(directory, "config.json")) as f:
+        config = json.load(f)
+    config["warmup"] = warmup
+    config["graph_workers"] = workers
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f)
+    environment = dict(os.environ, PYTHONPATH=REPO)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=directory, env=environment)
+
+def run(directory: str, warmup: bool, delay: float, workers: int, paths: list) -> dict:
+    port = free_port()
+    t0 = time.perf_counter()
+    server = start(directory, port, warmup, workers)
+    try:
+        while True:
+            if server.poll() is not None:
+                return {"error": "server exited with %d" % server.returncode}
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.01)
+        result = {"warmup": warmup, "delay": delay, "listen": time.perf_counter() - t0, "requests": dict()}
+        time.sleep(delay)
+        for path in paths:
+            sent = time.perf_counter() - t0
+            (seconds, status) = first_byte(port, path)
+            result["requests"][path] = {"sent": sent, "first_byte": seconds, "since_start": sent + seconds, "status": status}
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first byte after a restart")
+    parser.add_argument("--flights", type=int, default=10000)
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--delay", default="0,2", help="comma separated seconds between listening and the first request")
+    parser.add_argument("--graph-workers", type=int, default=2)
+    parser.add_argument("--paths", default="/,/graph/bt_ac,/flight/tenant0-1000")
+    parser.add_argument("--output", default="ttfb-report.json")
+    args = parser.parse_args()
+
+    results = list()
+    with tempfile.TemporaryDirectory(prefix="aid-ttfb-") as directory:
+        generate(directory, args.flights, args.tenants)
+        for name in ("templates", "static"):
+            os.symlink(os.path.join(REPO, name), os.path.join(directory, name))
+        for delay in [float(x) for x in args.delay.split(",")]:
+            for warmup in (False, True):
+                result = run(directory, warmup, delay, args.graph_workers, args.paths.split(","))
+                results.append(result)
+                if "error" in result:
+                    print("warmup=%s delay=%.1fs: %s" % (warmup, delay, result["error"]), file=sys.stderr)
+                    continue
+                timings = ", ".join("%s %.3fs" % (path, r["first_byte"]) for path, r in result["requests"].items())
+                print("warmup=%-5s delay=%.1fs: listening after %.3fs, first byte %s" % (warmup, delay, result["listen"], timings), file=sys.stderr)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "flights": args.flights,
+        "tenants": args.tenants,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
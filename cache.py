@@ -0,0 +1,50 @@
+import logging
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()] 
+)
+
+logger = logging.getLogger(__name__)
+
+class Cache(object):
+    _instance = None 
+    
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+    
+    @classmethod 
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+    
+    def init(self):
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+    
+    def invalidate(self):
+        # bumped by every write to flightlogs or metadata
+        with self.lock:
+            self.generation += 1
+            logger.debug("cache generation %d" % self.generation)
+    
+    def get(self, key: str, signature, build):
+        # the lock is held while building, so concurrent requests for the same
+        # entry wait for one build instead of parsing the files in parallel
+        with self.lock:
+            version = (self.generation, signature)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            value = build()
+            self.entries[key] = (version, value)
+            return value
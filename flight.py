@@ -1,11 +1,11 @@
 import datetime
+import itertools
 import logging
-from astral.sun import Observer, sun
 import re
 
-from airports import Airports
 from config import Config
 from metadata import Metadata
+from night import Night
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,7 +15,24 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+PRICECATS = {
+    "Charterflug": "Charter",
+    "Schulungsflug": "Schulung",
+    "Check-/Einweisungs-/&Uuml;bungsflug": "Check/Einw.",
+    "Charterflug mit Kurzfristbuchungsrabatt": "Kurzfristrabatt" 
+}
+
+def to_minutes(hhmm: str) -> int:
+    (hours, minutes) = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
 class Flight():
+    # slotted: large logs hold tens of thousands of these. The raw API strings
+    # are kept for display, derived values are parsed once (or lazily, once)
+    __slots__ = ("tenant", "id", "sortval", "date", "actype", "callsign", "crew", "departure", "destination",
+                 "takeoff", "landing", "blockoff", "blockon", "landings", "airtime", "blocktime", "pricecat",
+                 "blockminutes", "airminutes", "flightid", "night", "pic", "crewlist", "pax", "comment")
+    
     def __init__(self, tenant, data):
         self.tenant = tenant
         self.id = data['flightid']
@@ -30,26 +47,43 @@ class Flight():
         self.landing = data['landing']
         self.blockoff = data['blockoff']
         self.blockon = data['blockon']
-        self.landings = data['landings']
+        self.landings = int(data['landings'])
         self.airtime = data['airtime']
         self.blocktime = data['blocktime']
         self.pricecat = data['pricecat']
+        self.blockminutes = to_minutes(self.blocktime)
+        self.airminutes = to_minutes(self.airtime)
+        self.flightid = f"{self.tenant}-{self.id}"
+        self.night = None
+        self.pic = None
+        self.crewlist = None
+        self.invalidate()
+    
+    def invalidate(self):
+        # metadata-derived fields, called when the flight's metadata changes
+        self.pax = None
+        self.comment = None
     
     def getID(self) -> str:
-        return str(f"{self.tenant}-{self.id}")
+        return self.flightid
 
     def isPIC(self) -> bool:
+        if self.pic is None:
+            self.pic = self.is_pic(Config.instance().get('myself').lower())
+        return self.pic
+    
+    def is_pic(self, myself: str) -> bool:
         #TODO: move to config
-        if self.getID() in ["ffg-1668", "ffg-3575", "ffg-5269"]:
+        if self.flightid in ["ffg-1668", "ffg-3575", "ffg-5269"]:
             return False
-        if self.getID() in ["ffg-4853", "ffg-4854", "ffg-4855"]:
+        if self.flightid in ["ffg-4853", "ffg-4854", "ffg-4855"]:
             return True
     
         # charter flights are always PIC
         if not "charter" in self.pricecat.lower():
-            if f"<b>{Config.instance().get('myself').lower() }</b>" in self.crew.lower():
+            if f"<b>{myself}</b>" in self.crew.lower():
                 return True
-            if Config.instance().get('myself').lower() == self.crew.lower():
+            if myself == self.crew.lower():
                 return True
             return False
         return True
@@ -58,49 +92,62 @@ class Flight():
         return re.sub(r'<[^>]*>', '', text)
     
     def getCrew(self):
-        crew = self.remove_html_tags(self.crew)
-        crew = re.sub(r'[0-9]+', '', crew)
-        crew = crew.split("/")
-        crew = [x for x in crew if not Config.instance().get('myself').lower() in x.lower()]
-        crew = [x.strip() for x in crew]
-        return crew or []
+        if self.crewlist is None:
+            crew = self.remove_html_tags(self.crew)
+            crew = re.sub(r'[0-9]+', '', crew)
+            crew = crew.split("/")
+            crew = [x for x in crew if not Config.instance().get('myself').lower() in x.lower()]
+            crew = [x.strip() for x in crew]
+            self.crewlist = crew or []
+        return self.crewlist
     
     def getPax(self):
-        pax = self.getMetadata("pax")
-        if not pax:
-            return []
-        return pax.split(",")
+        if self.pax is None:
+            pax = self.getMetadata("pax")
+            self.pax = pax.split(",") if pax else []
+        return self.pax
     
     def getComment(self) -> str:
-        return self.getMetadata("comment") or ""
+        if self.comment is None:
+            self.comment = self.getMetadata("comment") or ""
+        return self.comment
     
     def getPricecat(self) -> str:
-        return {
-            "Charterflug": "Charter",
-            "Schulungsflug": "Schulung",
-            "Check-/Einweisungs-/&Uuml;bungsflug": "Check/Einw.",
-            "Charterflug mit Kurzfristbuchungsrabatt": "Kurzfristrabatt" 
-        }.get(self.pricecat, self.pricecat)
+        return PRICECATS.get(self.pricecat, self.pricecat)
         
     def getMetadata(self, attr: str):
-        meta = Metadata.instance().get_metadata(self.getID())
+        meta = Metadata.instance().get_metadata(self.flightid)
         if meta and attr in meta:
             return meta[attr]
         return None
     
     def getBlocktime(self) -> datetime.timedelta:
-        (hours, minutes) = self.blocktime.split(":")
-        return datetime.timedelta(hours=int(hours), minutes=int(minutes))
+        return datetime.timedelta(minutes=self.blockminutes)
     
-    def isNight(self) -> str:
-        departure = Airports.instance().airports[self.departure]
-        destination = Airports.instance().airports[self.destination]
-        sun_dep = sun(Observer(departure['lat'], departure['lon'], departure['elevation']/3.28084), self.date)
-        sun_dest = sun(Observer(destination['lat'], destination['lon'], destination['elevation']/3.28084), self.date)
-        
-        blockoff = datetime.datetime.strptime(self.blockoff, "%H:%M").replace(year=self.date.year,month=self.date.month,day=self.date.day,tzinfo=datetime.timezone.utc)
-        blockon = datetime.datetime.strptime(self.blockon, "%H:%M").replace(year=self.date.year,month=self.date.month,day=self.date.day,tzinfo=datetime.timezone.utc)
-
-        if blockoff > sun_dep['dusk'] and blockon > sun_dest['dusk']:
-            return True
-        return False
+    def isNight(self) -> bool:
+        if self.night is None:
+            self.night = Night.instance().is_night(self)
+        return self.night
+    
+    def columns(flights: list) -> dict:
+        # slot -> values for the flightlog snapshot; equal strings are shared
+        # so they are pickled once. The metadata fields are left out
+        columns = dict()
+        for name in Flight.__slots__:
+            if name in ("pax", "comment"):
+                continue
+            values = [getattr(f, name) for f in flights]
+            if values and isinstance(values[0], str):
+                shared = dict()
+                values = [shared.setdefault(v, v) for v in values]
+            columns[name] = values
+        return columns
+    
+    def from_columns(columns: dict) -> list:
+        # filled slot by slot through the descriptors, much faster than
+        # unpickling one object per flight
+        flights = [Flight.__new__(Flight) for _ in columns["id"]]
+        for name in Flight.__slots__:
+            values = columns.get(name) or itertools.repeat(None, len(flights))
+            list(map(getattr(Flight, name).__set__, flights, values))
+        return flights
@@ -1,11 +1,20 @@
-import json, os, logging, datetime
+import json, os, logging, datetime, pickle, time
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
 from dateutil.relativedelta import relativedelta
 from collections import defaultdict
-import pandas
 import re
 
+from airports import Airports
+from cache import Cache
+from config import Config
 from flight import Flight
+from flighttable import FlightTable, MonthCube
 from metadata import Metadata
+from metrics import Metrics
+from night import Night
+from persons import Persons
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,28 +30,88 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+def timedelta_toString(delta : datetime.timedelta) -> str:
+    total_minutes = int(delta.total_seconds() // 60)
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+    return f"{hours:02d}:{minutes:02d}"
+
+def average_toString(minutes: int, months: int) -> str:
+    seconds = minutes * 60
+    return f"{int(seconds/months//3600)}:{int(seconds/months%3600//60):02d}"
+
+def month_range(first: datetime.datetime, last: datetime.datetime) -> list:
+    # (year, month) of every month from first to last, both included
+    months = list()
+    (year, month) = (first.year, first.month)
+    while (year, month) <= (last.year, last.month):
+        months.append((year, month))
+        (year, month) = (year + month // 12, month % 12 + 1)
+    return months
+
+# bump when the pickled Flight layout or derivation changes
+SNAPSHOT_VERSION = 1
+
+TOTALS = ["blocktime", "blocktime_pic", "blocktime_dual", "blocktime_night", "airtime", "landings", "landings_pic", "landings_night", "landings_nightpic"]
+
 class FlightLog:
-    acc_blocktime = None 
-    acc_blocktime_pic = None 
-    acc_blocktime_night = None
-    acc_airtime = None 
-    landings = None
-    landings_pic = None
-    landings_night = None
-    landings_nightpic = None
-    flights = list()
+    _locks = dict()
+    _locks_lock = threading.Lock()
+    
+    def __init__(self):
+        self.tenant = None
+        self.flights = list()
+        self.index = dict()
+        self.min = None
+        self.max = None
+        self.totals = None
+        self.table = None
+        self.memo = dict()
 
     def virtual(tenants):
-        flightlog = FlightLog()
-        for t in tenants:
-            tenant = FlightLog.file(t["name"])
-            for flight in tenant.get_all():
-                if not any(flight.getID() == f.getID() for f in flightlog.flights):
-                    flightlog.flights.append(flight)
-                flightlog.flights.sort(key=lambda x: x.sortval, reverse=True)
-                flightlog.min = min(flightlog.flights, key=lambda x: x.sortval)
-                flightlog.max = max(flightlog.flights, key=lambda x: x.sortval)
-        return flightlog 
+        with Metrics.instance().span("flightlog_virtual"):
+            flightlog = FlightLog()
+            logs = [FlightLog.file(t["name"]).get_all() for t in tenants]
+            # every tenant list is sorted newest first, so a single k-way merge
+            # keeps the order; the id index dedups flights present in several files
+            for flight in heapq.merge(*logs, key=lambda x: x.sortval, reverse=True):
+                flight_id = flight.getID()
+                if flight_id in flightlog.index:
+                    continue
+                flightlog.index[flight_id] = flight
+                flightlog.flights.append(flight)
+                if flightlog.max is None:
+                    flightlog.max = flight
+                flightlog.min = flight
+            # only the airports of the stored flights are loaded
+            with Metrics.instance().span("airports"):
+                Airports.instance().load({f.departure for f in flightlog.flights} | {f.destination for f in flightlog.flights})
+            Night.instance().precompute(flightlog.flights)
+            with Metrics.instance().span("flighttable"):
+                flightlog.get_table()
+            return flightlog 
+    
+    def cached(tenants):
+        # shared, read-only merged log; rebuilt when a tenant file changes on
+        # disk or the cache generation is bumped by store()/write()
+        signature = tuple((t["name"], FlightLog.signature(t["name"])) for t in tenants)
+        return Cache.instance().get("virtual", signature, lambda: FlightLog.virtual(tenants))
+    
+    def path(tenant: str) -> str:
+        return 'data/flightlog_%s.dat' % tenant
+    
+    def journal(tenant: str) -> str:
+        return 'data/flightlog_%s.jsonl' % tenant
+    
+    def signature(tenant: str):
+        signature = list()
+        for filename in (FlightLog.path(tenant), FlightLog.journal(tenant)):
+            try:
+                stat = os.stat(filename)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
     
     def file(tenant: str):
         flightlog = FlightLog()
@@ -51,177 +120,511 @@ class FlightLog:
         return flightlog
     
     def __str__(self):
-        tenant = self.tenant["name"] if "name" in self.tenant else "n/a"
-        base = f"File <{tenant}>" if self.tenant else "Virtual"
+        base = f"File <{self.tenant}>" if self.tenant else "Virtual"
         noflights = len(self.flights)
         return f"Flightlog {base}, {noflights} flights."
     
-    def cut(self, flight_id: str):
-        sortval = self.get_flight(flight_id).sortval
-        self.flights = [f for f in self.flights if f.sortval <= sortval]
-    
     def load_tenant(self):
-        self.filename = 'data/flightlog_%s.dat' % self.tenant
-        if os.path.exists(self.filename):
-            with open(self.filename, "r") as f:
-                file_contents = f.read()
-                if len(file_contents) > 0:
-                    self.data = json.loads(file_contents)
-                    self.process()
+        # flightlog_<tenant>.dat is the compacted snapshot, flights stored
+        # since then are appended to flightlog_<tenant>.jsonl, one per line.
+        # flightlog_<tenant>.pickle holds the parsed flights of both, the raw
+        # records are only read when flights are stored or compacted
+        self.filename = FlightLog.path(self.tenant)
+        self.journalfilename = FlightLog.journal(self.tenant)
+        self.snapshotfilename = FlightLog.snapshot(self.tenant)
+        self.journal_limit = 1000
+        self.journal_entries = 0
+        self.journal_offset = 0
+        self.data = None
+        with Metrics.instance().span("flightlog_snapshot"):
+            if self.load_snapshot():
+                return
+        # taken before reading, a concurrent compaction only causes a rebuild
+        self.source = self.stat()
+        self.get_data()
+        self.ids = {str(f['flightid']) for f in self.data}
+        self.process()
+        self.save_snapshot()
+    
+    def snapshot(tenant: str) -> str:
+        return 'data/flightlog_%s.pickle' % tenant
+    
+    def stat(self):
+        try:
+            stat = os.stat(self.filename)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+    
+    def snapshot_key(self) -> tuple:
+        # everything besides the source files the pickled flights depend on;
+        # date, night and the month grouping follow the local timezone
+        timezone = (time.tzname, time.timezone, time.altzone)
+        return (SNAPSHOT_VERSION, Flight.__slots__, Config.instance().get('myself'), Airports.instance().version(), timezone)
+    
+    def get_data(self) -> list:
+        # raw API records of the .dat file and the journal
+        if self.data is None:
+            self.data = list()
+            with Metrics.instance().span("flightlog_json"):
+                if os.path.exists(self.filename):
+                    with open(self.filename, "r") as f:
+                        file_contents = f.read()
+                        if len(file_contents) > 0:
+                            self.data = json.loads(file_contents)
+                self.journal_entries = 0
+                self.journal_offset = 0
+                self.replay_journal(self.data)
+        return self.data
+    
+    def replay_journal(self, data: list):
+        # appends the journal entries after journal_offset to data. Readers
+        # stop at an incomplete last line, it is either being written right
+        # now or left by a crash, and only the writer repairs it (append())
+        if not os.path.exists(self.journalfilename):
+            return
+        with open(self.journalfilename, "rb") as f:
+            f.seek(self.journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
                     return
-        self.data = list()
+                try:
+                    data.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning("ignoring corrupt journal entry in %s" % self.journalfilename)
+                self.journal_entries += 1
+                self.journal_offset += len(line)
+    
+    def derive(self, flights: list):
+        # fields that only depend on the flight and the config, so they can
+        # be kept in the snapshot
+        Airports.instance().load({f.departure for f in flights} | {f.destination for f in flights})
+        Night.instance().precompute(flights)
+        for flight in flights:
+            flight.isPIC()
+            flight.getCrew()
+    
+    def load_snapshot(self) -> bool:
+        # valid while the .dat file is unchanged and the journal has only
+        # grown; entries appended since are parsed on top
+        try:
+            with open(self.snapshotfilename, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot["key"] != self.snapshot_key() or snapshot["source"] != self.stat():
+                return False
+            flights = Flight.from_columns(snapshot["flights"])
+            (self.journal_entries, self.journal_offset) = (snapshot["journal_entries"], snapshot["journal_offset"])
+        except FileNotFoundError:
+            return False
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError, AttributeError, ValueError) as e:
+            logger.warning("ignoring flightlog snapshot %s: %s" % (self.snapshotfilename, e))
+            return False
+        if os.path.exists(self.journalfilename):
+            if os.path.getsize(self.journalfilename) < self.journal_offset:
+                return False
+        elif self.journal_offset > 0:
+            return False
+        tail = list()
+        self.replay_journal(tail)
+        if tail:
+            new = [Flight(self.tenant, flight) for flight in tail]
+            self.derive(new)
+            flights.extend(new)
+            flights.sort(key=lambda x: x.sortval, reverse=True)
+        self.flights = flights
+        self.ids = {str(f.id) for f in self.flights}
+        self.finish()
+        return True
+    
+    def save_snapshot(self):
+        # the snapshot is an optimisation, the flights stay usable without it
+        try:
+            self.derive(self.flights)
+        except Exception as e:
+            logger.warning("not writing flightlog snapshot %s: %s" % (self.snapshotfilename, e))
+            return
+        snapshot = {
+            "key": self.snapshot_key(),
+            "source": self.source,
+            "journal_entries": self.journal_entries,
+            "journal_offset": self.journal_offset,
+            "flights": Flight.columns(self.flights),
+        }
+        try:
+            if not os.path.exists("data/"):
+                os.mkdir("data")
+            tmpfilename = self.snapshotfilename + ".tmp"
+            with open(tmpfilename, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfilename, self.snapshotfilename)
+        except OSError as e:
+            logger.warning("could not write flightlog snapshot: %s" % e)
     
     def process(self):
         self.flights = []
-        for flight in self.data:
-            self.flights.append(Flight(self.tenant, flight))
-        self.min = min(self.flights, key=lambda x: x.sortval)
-        self.max = max(self.flights, key=lambda x: x.sortval)
+        with Metrics.instance().span("flight_construct"):
+            for flight in self.data:
+                self.flights.append(Flight(self.tenant, flight))
+        self.flights.sort(key=lambda x: x.sortval, reverse=True)
+        self.finish()
     
-    def store(self, data):
-        ids = [f"{f['flightid']}" for f in self.data]
+    def finish(self):
+        self.index = {f.getID(): f for f in self.flights}
+        self.min = self.flights[-1] if self.flights else None
+        self.max = self.flights[0] if self.flights else None
+    
+    def store(self, data) -> int:
+        new = list()
         for flight in data:
             if flight['flightid'] == 0:
                 # print("Skipping: ", flight)
                 continue
             
-            if flight['flightid'] in ids:
+            # the API sends numeric ids, compare as strings like the loaded data
+            flightid = str(flight['flightid'])
+            if flightid in self.ids:
                 # print("Skipping %s because already exists in data." % flight['flightid'])
                 continue
-            self.data.append(flight)
-        self.write()
+            self.ids.add(flightid)
+            new.append(flight)
+        if new:
+            self.append(new)
+        return len(new)
+    
+    def lock(tenant: str) -> threading.RLock:
+        # one writer per tenant file: append() and write() hold it, readers
+        # never write
+        with FlightLog._locks_lock:
+            return FlightLog._locks.setdefault(tenant, threading.RLock())
+    
+    def append(self, flights: list):
+        # only the journal grows; the raw records are not kept in memory,
+        # write() reads them back from the files when it compacts. A batch is
+        # a single write, so readers see all of it or none
+        lines = "".join(json.dumps(flight, cls=DateTimeEncoder) + "\n" for flight in flights).encode()
+        with FlightLog.lock(self.tenant):
+            if not os.path.exists("data/"):
+                os.mkdir("data")
+            self.repair_journal()
+            with open(self.journalfilename, "ab") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.data = None
+            self.journal_entries += len(flights)
+            if self.journal_entries >= self.journal_limit:
+                self.write()
+                self.data = None
+                return
+        Cache.instance().invalidate()
+    
+    def repair_journal(self):
+        # with the lock held a partial last line can only be left by a crash;
+        # cut it off so new entries do not continue it
+        try:
+            with open(self.journalfilename, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                end = size
+                while end > 0:
+                    start = max(0, end - 64 * 1024)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                if end < size:
+                    logger.warning("dropping incomplete journal entry in %s" % self.journalfilename)
+                    f.truncate(end)
+        except FileNotFoundError:
+            pass
         
     def write(self):
-        if not hasattr(self, "data"):
+        # compaction: atomic snapshot (temp file + rename), then drop the journal
+        if self.tenant is None:
             return
-        if not os.path.exists("data/"):
-            os.mkdir("data")
-        with open(self.filename, "w") as f:
-            f.write(json.dumps(self.data, cls=DateTimeEncoder))
+        with FlightLog.lock(self.tenant):
+            # read back under the lock, nothing is appended in between
+            self.data = None
+            data = self.get_data()
+            if not os.path.exists("data/"):
+                os.mkdir("data")
+            tmpfilename = self.filename + ".tmp"
+            with open(tmpfilename, "w") as f:
+                f.write(json.dumps(data, cls=DateTimeEncoder))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpfilename, self.filename)
+            self.source = self.stat()
+            if os.path.exists(self.journalfilename):
+                os.remove(self.journalfilename)
+            self.journal_entries = 0
+            self.journal_offset = 0
+        Cache.instance().invalidate()
     
     def get_flight(self, flight_id: str):
-        flight = next((f for f in self.flights if f.getID() == flight_id), None)
-        return flight
+        return self.index.get(flight_id)
     
     def get_all(self):
         return self.flights if self.flights else list()
     
+    def memoize(self, key, build):
+        # derived data kept for the lifetime of this (immutable, cached) log
+        if not key in self.memo:
+            self.memo[key] = build()
+        return self.memo[key]
+
+    def invalidate_metadata(self, flight_id: str):
+        # a metadata edit only touches the flight's pax/comment and what is
+        # derived from them, the log itself is not rebuilt
+        flight = self.get_flight(flight_id)
+        if flight is not None:
+            flight.invalidate()
+            if self.tenant is None:
+                Persons.instance().update(flight)
+            elif ("personindex",) in self.memo:
+                self.memo[("personindex",)].update(flight)
+        self.memo.pop(("persons",), None)
+
+    def cursor(flight) -> str:
+        # page position: sortval plus id, so flights sharing a sortval are not skipped
+        return f"{flight.sortval}_{flight.getID()}"
+    
+    def position(self, cursor: str) -> int:
+        # index of the first flight older than the cursor
+        (sortval, flight_id) = cursor.split("_", 1)
+        sortval = int(sortval)
+        keys = self.memoize(("sortkeys",), lambda: [-f.sortval for f in self.flights])
+        lo = bisect_left(keys, -sortval)
+        hi = bisect_right(keys, -sortval)
+        for i in range(lo, hi):
+            if self.flights[i].getID() == flight_id:
+                return i + 1
+        return lo
+    
+    def get_page(self, start: int = 0, size: int = 100) -> tuple:
+        # (flights, cursor for the next page or None)
+        flights = self.flights[start:start+size]
+        more = start + size < len(self.flights)
+        return (flights, FlightLog.cursor(flights[-1]) if flights and more else None)
+    
+    def get_table(self):
+        # columnar view of self.flights, None without numpy
+        if self.table is None:
+            self.table = FlightTable.build(self.flights)
+        return self.table
+    
+
+    def get_cube(self):
+        # monthly aggregates behind the charts, None without numpy
+        table = self.get_table()
+        return self.memoize(("cube",), lambda: MonthCube.build(table) if table is not None else None)
+    
+    def get_totals(self):
+        # prefix sums in chronological order: sums[key][i] is the total of
+        # the first i flights, so any window is two bisects and a subtraction
+        if self.totals is None and self.get_table() is not None:
+            table = self.get_table()
+            columns = {
+                "blocktime": table.blocktime,
+                "blocktime_pic": table.blocktime * table.pic,
+                "blocktime_dual": table.blocktime * ~table.pic,
+                "blocktime_night": table.blocktime * table.night,
+                "airtime": table.airtime,
+                "landings": table.landings,
+                "landings_pic": table.landings * table.pic,
+                "landings_night": table.landings * table.night,
+                "landings_nightpic": table.landings * (table.night & table.pic),
+            }
+            sums = {key: table.prefix_sums(columns[key]) for key in TOTALS}
+            self.totals = (table.sortval[::-1].tolist(), sums)
+        if self.totals is None:
+            sortvals = list()
+            sums = {key: [0] for key in TOTALS}
+            for flight in reversed(self.flights):
+                blocktime = flight.blockminutes
+                landings = flight.landings
+                pic = flight.isPIC()
+                night = flight.isNight()
+                values = {
+                    "blocktime": blocktime,
+                    "blocktime_pic": blocktime if pic else 0,
+                    "blocktime_dual": 0 if pic else blocktime,
+                    "blocktime_night": blocktime if night else 0,
+                    "airtime": flight.airminutes,
+                    "landings": landings,
+                    "landings_pic": landings if pic else 0,
+                    "landings_night": landings if night else 0,
+                    "landings_nightpic": landings if night and pic else 0,
+                }
+                sortvals.append(flight.sortval)
+                for key in TOTALS:
+                    sums[key].append(sums[key][-1] + values[key])
+            self.totals = (sortvals, sums)
+        return self.totals
+    
+    def get_period_totals(self, date_from: datetime.datetime = None, date_till: datetime.datetime = None) -> dict:
+        # exclusive on both ends
+        (sortvals, sums) = self.get_totals()
+        lo = bisect_right(sortvals, date_from.timestamp()) if date_from else 0
+        hi = bisect_left(sortvals, date_till.timestamp()) if date_till else len(sortvals)
+        hi = max(lo, hi)
+        return {key: sums[key][hi] - sums[key][lo] for key in TOTALS}
+
+    def get_logbook_index(self) -> dict:
+        # flight id -> (lo, hi) into the prefix sums: the flights before its
+        # sortval and up to and including it, flights sharing a sortval count
+        # together like in cut()
+        def build():
+            (sortvals, _) = self.get_totals()
+            chronological = list(reversed(self.flights))
+            index = dict()
+            lo = 0
+            for hi in range(1, len(sortvals) + 1):
+                if hi < len(sortvals) and sortvals[hi] == sortvals[lo]:
+                    continue
+                for i in range(lo, hi):
+                    index[chronological[i].getID()] = (lo, hi)
+                lo = hi
+            return index
+        return self.memoize(("logbook",), build)
+
+    def get_range_totals(self, first_id: str, last_id: str) -> dict:
+        # totals of the flights from first_id to last_id (inclusive), e.g.
+        # one logbook page; None if either flight is unknown
+        index = self.get_logbook_index()
+        if not first_id in index or not last_id in index:
+            return None
+        (_, sums) = self.get_totals()
+        lo = index[first_id][0]
+        hi = max(lo, index[last_id][1])
+        return {key: sums[key][hi] - sums[key][lo] for key in TOTALS}
+
+    def get_logbook_sums(self, flight_id: str) -> dict:
+        # running totals of the logbook up to and including flight_id
+        if self.min is None:
+            return None
+        return self.get_range_totals(self.min.getID(), flight_id)
 
+    def get_statistics(self, now: datetime.datetime = None, windows: tuple = (12, 6, 3, 1)) -> dict:
+        with Metrics.instance().span("statistics"):
+            return self.statistics(now or datetime.datetime.now(), windows)
+    
+    def statistics(self, now: datetime.datetime, windows: tuple) -> dict:
+        totals = self.get_period_totals()
+        
+        stat = {}
+        stat["blocktime"] = timedelta_toString(datetime.timedelta(minutes=totals["blocktime"]))
+        stat["blocktime_pic"] = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_pic"]))
+        stat["blocktime_dual"] = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_dual"]))
+        stat["blocktime_night"] = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_night"]))
+        stat["airtime"] = timedelta_toString(datetime.timedelta(minutes=totals["airtime"]))
+        stat["landings"] = (totals["landings"], totals["landings_pic"], totals["landings_night"], totals["landings_nightpic"])
+        stat["aircraft"] = ", ".join(self.get_aircraft_types())
+        stat["noflights"] = len(self.flights)
+        
+        if len(self.flights) > 0:
+            max_delta = relativedelta(now, self.min.date)
+            alltime = max_delta.years*12+max_delta.months+1
+        else: 
+            alltime = 1
+        
+        stat["avg_blocktimes"] = list()
+        stat["avg_pictimes"] = list()
+        stat["avg_dualtimes"] = list()
+        stat["avg_nighttimes"] = list()
+        
+        for x in [alltime, *windows]:
+            period = self.get_period_totals(now - relativedelta(months=x), now)
+            stat["avg_blocktimes"].append(average_toString(period["blocktime"], x))
+            stat["avg_pictimes"].append(average_toString(period["blocktime_pic"], x))
+            stat["avg_dualtimes"].append(average_toString(period["blocktime_dual"], x))
+            stat["avg_nighttimes"].append(average_toString(period["blocktime_night"], x))
+        return stat
+    
     def get_blocktime(self) -> datetime.timedelta: 
-        if not self.acc_blocktime:
-            self.acc_blocktime = datetime.timedelta(0)
-            for flight in self.flights:
-                blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-                delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-                self.acc_blocktime += delta
-        return self.acc_blocktime
+        return datetime.timedelta(minutes=self.get_period_totals()["blocktime"])
     
     def get_blocktime_dual(self) -> datetime.timedelta:
-        return self.get_blocktime() - self.get_blocktime_pic()
+        return datetime.timedelta(minutes=self.get_period_totals()["blocktime_dual"])
     
     def get_blocktime_pic(self) -> datetime.timedelta: 
-        if not self.acc_blocktime_pic:
-            self.acc_blocktime_pic = datetime.timedelta(0)
-            for flight in self.flights:
-                if not flight.isPIC():
-                    continue
-                blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-                delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-                self.acc_blocktime_pic += delta
-        return self.acc_blocktime_pic
+        return datetime.timedelta(minutes=self.get_period_totals()["blocktime_pic"])
     
     def get_blocktime_night(self) -> datetime.timedelta: 
-        if not self.acc_blocktime_night:
-            self.acc_blocktime_night = datetime.timedelta(0)
-            for flight in self.flights:
-                if not flight.isNight():
-                    continue
-                blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-                delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-                self.acc_blocktime_night += delta
-        return self.acc_blocktime_night
+        return datetime.timedelta(minutes=self.get_period_totals()["blocktime_night"])
 
     def get_airtime(self) -> datetime.timedelta:
-        if not self.acc_airtime:
-            self.acc_airtime = datetime.timedelta(0)
-            for flight in self.flights:
-                airtime = datetime.datetime.strptime(flight.airtime, "%H:%M")
-                delta = datetime.timedelta(hours=airtime.hour, minutes=airtime.minute)
-                self.acc_airtime += delta
-        return self.acc_airtime
-    
-    def get_landings(self) -> int:
-        if not self.landings:
-            self.landings = sum(int(l.landings) for l in self.flights)
-            
-        if not self.landings_pic:
-            self.landings_pic = sum(int(l.landings) for l in self.flights if l.isPIC())
-        
-        if not self.landings_night:
-            self.landings_night = sum(int(l.landings) for l in self.flights if l.isNight())
-        
-        if not self.landings_nightpic:
-            self.landings_nightpic = sum(int(l.landings) for l in self.flights if l.isNight() and l.isPIC())
-            
-        return (self.landings, self.landings_pic, self.landings_night, self.landings_nightpic)
+        return datetime.timedelta(minutes=self.get_period_totals()["airtime"])
+    
+    def get_landings(self) -> tuple:
+        totals = self.get_period_totals()
+        return (totals["landings"], totals["landings_pic"], totals["landings_night"], totals["landings_nightpic"])
+    
+    def get_person_index(self):
+        # the merged log catches the shared crew/pax index up once, a tenant
+        # log gets its own so it does not drop the other tenants' flights
+        if self.tenant is None:
+            return self.memoize(("personindex",), lambda: Persons.instance().reconcile(self))
+        return self.memoize(("personindex",), lambda: Persons.of(self))
+    
+    def get_flights_with(self, person: str) -> list:
+        return [self.index[flight_id] for flight_id in self.get_person_index().flights_with(person) if flight_id in self.index]
     
     def get_flights_groupedby_person(self):
-        grouped = defaultdict(list)
-        for flight in self.flights:     
-            for person in flight.getCrew():
-                person = person.strip()
-                if not any(flight.getID() == f.getID() for f in grouped[person]):
-                    grouped[person].append(flight)   
-            for person in flight.getPax():
-                person = person.strip()
-                if not any(flight.getID() == f.getID() for f in grouped[person]):
-                    grouped[person].append(flight)   
+        grouped = dict()
+        for person in self.get_person_index().get_blocktimes():
+            grouped[person] = self.get_flights_with(person)
         return grouped 
     
     def get_flights_groupedby_month(self, f_aircraft=None, f_pic=False):
         grouped = defaultdict(list)
-        for flight in self.flights:
-            if f_aircraft and not f_aircraft.lower() in flight.actype.lower():
-                continue
-            
-            if f_pic and not flight.isPIC():
-                continue
-            
-            grouped[(flight.date.year, flight.date.month)].append(flight)
+        table = self.get_table()
+        if table is not None:
+            for (year, month), positions in table.group_by_month(table.filter(f_aircraft, f_pic)).items():
+                grouped[(year, month)] = [self.flights[i] for i in positions]
+        else:
+            for flight in self.flights:
+                if f_aircraft and not f_aircraft.lower() in flight.actype.lower():
+                    continue
+                
+                if f_pic and not flight.isPIC():
+                    continue
+                
+                grouped[(flight.date.year, flight.date.month)].append(flight)
             
         # fill gaps (empty months)
         if len(grouped) <= 0:
             return (None, dict())
         
-        daterange = pandas.date_range(start=self.min.date.replace(day=1), end=self.max.date+relativedelta(months=1), freq='MS', inclusive="both")
-        all_months = daterange.to_period('M')
+        # one month past the newest flight, like the cube
+        all_months = month_range(self.min.date, self.max.date + relativedelta(months=1))
         
         # fill gaps -> defaultdict
         for month in all_months:
-            len(grouped[month.year,month.month])
+            len(grouped[month])
             
         return (all_months, dict(sorted(grouped.items())))
     
-    def get_flights_by_date_period(self, date_from: datetime.datetime, date_till: datetime.datetime) -> list:
-        results = list()
-        for flight in self.flights:
-            if flight.date > date_from and flight.date < date_till:
-                results.append(flight)
-        return results
-    
     def get_aircraft_types(self):
+        if self.get_table() is not None:
+            return list(self.get_table().actypes)
         aircraft = set()
         for flight in self.flights:
             aircraft.add(flight.actype)
         return sorted(aircraft)
     
     def get_callsigns(self):
+        if self.get_table() is not None:
+            return list(self.get_table().callsigns)
         aircraft = set()
         for flight in self.flights:
             aircraft.add(flight.callsign)
         return sorted(aircraft)
     
     def get_airports(self):
+        if self.get_table() is not None:
+            return self.get_table().airport_counts()
         airports = dict()
         for flight in self.flights:
             if not flight.departure in airports:
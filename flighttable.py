@@ -0,0 +1,136 @@
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()] 
+)
+
+logger = logging.getLogger(__name__)
+
+class FlightTable:
+    # columnar copy of a flight list (same order) for vectorized aggregates;
+    # only available when numpy is installed
+    
+    def available() -> bool:
+        return numpy is not None
+    
+    def build(flights: list):
+        if numpy is None:
+            return None
+        table = FlightTable()
+        table.size = len(flights)
+        table.blocktime = numpy.fromiter((f.blockminutes for f in flights), dtype=numpy.int64, count=len(flights))
+        table.airtime = numpy.fromiter((f.airminutes for f in flights), dtype=numpy.int64, count=len(flights))
+        table.landings = numpy.fromiter((f.landings for f in flights), dtype=numpy.int64, count=len(flights))
+        table.sortval = numpy.fromiter((f.sortval for f in flights), dtype=numpy.int64, count=len(flights))
+        table.month = numpy.fromiter((f.date.year * 12 + f.date.month - 1 for f in flights), dtype=numpy.int64, count=len(flights))
+        table.pic = numpy.fromiter((f.isPIC() for f in flights), dtype=bool, count=len(flights))
+        table.night = numpy.fromiter((f.isNight() for f in flights), dtype=bool, count=len(flights))
+        
+        # categorical columns: sorted category names plus one code per flight
+        (table.actypes, table.actype) = table.categorical([f.actype for f in flights])
+        (table.callsigns, table.callsign) = table.categorical([f.callsign for f in flights])
+        (table.airports, codes) = table.categorical([f.departure for f in flights] + [f.destination for f in flights])
+        table.departure = codes[:len(flights)]
+        table.destination = codes[len(flights):]
+        return table
+    
+    def categorical(self, values: list):
+        if len(values) <= 0:
+            return (list(), numpy.zeros(0, dtype=numpy.int64))
+        (categories, codes) = numpy.unique(numpy.array(values, dtype=object), return_inverse=True)
+        return (categories.tolist(), codes.astype(numpy.int64))
+    
+    def prefix_sums(self, column) -> list:
+        # chronological (oldest first) running totals with a leading zero
+        return numpy.concatenate(([0], numpy.cumsum(column[::-1]))).tolist()
+    
+    def airport_counts(self) -> dict:
+        # departure and (if different) destination per flight, counted in
+        # order of first appearance like the loop in FlightLog.get_airports()
+        sequence = numpy.stack((self.departure, self.destination), axis=1).ravel()
+        mask = numpy.stack((numpy.ones(self.size, dtype=bool), self.departure != self.destination), axis=1).ravel()
+        (codes, first, counts) = numpy.unique(sequence[mask], return_index=True, return_counts=True)
+        order = numpy.argsort(first, kind="stable")
+        return {self.airports[codes[i]]: int(counts[i]) for i in order}
+    
+    def filter(self, f_aircraft=None, f_pic=False):
+        # same filters as FlightLog.get_flights_groupedby_month()
+        mask = numpy.ones(self.size, dtype=bool)
+        if f_aircraft:
+            match = numpy.array([f_aircraft.lower() in x.lower() for x in self.actypes], dtype=bool)
+            mask &= match[self.actype]
+        if f_pic:
+            mask &= self.pic
+        return mask
+    
+    def group_by_month(self, mask=None) -> dict:
+        # (year, month) -> positions of the flights, in list order
+        positions = numpy.arange(self.size) if mask is None else numpy.flatnonzero(mask)
+        months = self.month[positions]
+        order = numpy.argsort(months, kind="stable")
+        (keys, starts) = numpy.unique(months[order], return_index=True)
+        groups = numpy.split(positions[order], starts[1:])
+        return {(int(key) // 12, int(key) % 12 + 1): group for key, group in zip(keys, groups)}
+
+class MonthCube:
+    # block/air minutes and landings summed per distinct (month, actype,
+    # callsign, PIC, night); covers every month from the first flight to one
+    # month after the last, like FlightLog.get_flights_groupedby_month()
+    
+    def build(table: FlightTable):
+        cube = MonthCube()
+        cube.table = table
+        cube.months = list()
+        cube.measures = dict()
+        if table.size <= 0:
+            cube.month = cube.actype = cube.callsign = numpy.zeros(0, dtype=numpy.int64)
+            cube.pic = cube.night = numpy.zeros(0, dtype=bool)
+            return cube
+        
+        first = int(table.month.min())
+        last = int(table.month.max()) + 1
+        cube.months = [(month // 12, month % 12 + 1) for month in range(first, last + 1)]
+        
+        keys = numpy.stack((table.month - first, table.actype, table.callsign, table.pic, table.night), axis=1)
+        (rows, inverse) = numpy.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        cube.month = rows[:, 0]
+        cube.actype = rows[:, 1]
+        cube.callsign = rows[:, 2]
+        cube.pic = rows[:, 3].astype(bool)
+        cube.night = rows[:, 4].astype(bool)
+        for name, column in (("blocktime", table.blocktime), ("airtime", table.airtime), ("landings", table.landings)):
+            cube.measures[name] = numpy.bincount(inverse, weights=column, minlength=len(rows)).astype(numpy.int64)
+        return cube
+    
+    def slice(self, measure: str = "blocktime", by: str = None, aircraft: str = None, pic: bool = None, night: bool = None):
+        # -> (months, {series: one value per month}), series are "values" or
+        # every actype/callsign when grouped by one; empty if nothing matches
+        mask = numpy.ones(len(self.month), dtype=bool)
+        if aircraft:
+            match = numpy.array([aircraft.lower() in x.lower() for x in self.table.actypes], dtype=bool)
+            mask &= match[self.actype]
+        if pic is not None:
+            mask &= self.pic == pic
+        if night is not None:
+            mask &= self.night == night
+        if not mask.any():
+            return (list(), dict())
+        
+        months = self.month[mask]
+        values = self.measures[measure][mask]
+        if by is None:
+            totals = numpy.bincount(months, weights=values, minlength=len(self.months)).astype(numpy.int64)
+            return (self.months, {"values": totals.tolist()})
+        
+        names = self.table.actypes if by == "actype" else self.table.callsigns
+        grid = numpy.zeros((len(names), len(self.months)), dtype=numpy.int64)
+        numpy.add.at(grid, (getattr(self, by)[mask], months), values)
+        return (self.months, {name: grid[i].tolist() for i, name in enumerate(names)})
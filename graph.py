@@ -0,0 +1,291 @@
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+styled = False
+
+def init_style():
+    # matplotlib is only imported by the first render (or a warm-up), not
+    # with the app
+    global styled
+    import matplotlib.style
+    # plt.style.use('Solarize_Light2')
+    matplotlib.style.use('fast')
+    styled = True
+
+def render_bar(keys : list, values : dict, title : str, xlabel : str = None, ylabel : str = None, stacked : bool = True, barwidth : float = 0.9, legend : bool = True, xdates : bool = False) -> bytes:
+    import matplotlib.dates as mdates
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    if not styled:
+        init_style()
+
+    # object-oriented Agg API only, no pyplot state, so renders can run in
+    # parallel (threads or processes) without drawing into each other
+    fig = Figure(figsize=(10, 6), layout="constrained")
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if xdates:
+        keys = [datetime.datetime.strptime(date, '%Y-%m').date() for date in keys]
+        ax.xaxis.set_minor_formatter(mdates.DateFormatter('%b'))
+        ax.xaxis.set_minor_locator(mdates.MonthLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%b'))
+        ax.xaxis.set_major_locator(mdates.YearLocator())
+        barwidth = 25
+    else:
+        ax.set_xticks(list(range(len(keys))))
+        ax.set_xticklabels(keys, rotation=45)
+
+    if stacked:
+        bottom = [0] * len(next(iter(values.values())))
+        for x, v in values.items():
+            ax.bar(keys, v, width=barwidth, label=x, bottom=bottom)
+            bottom = [a + b for a, b in zip(bottom, v)]
+    else:
+        barwidth = barwidth / len(values)
+        width = len(values) * barwidth
+        c = 1
+        for x, v in values.items():
+            k = list(range(len(v)))
+            ax.bar([x-width/2+c*barwidth-barwidth/2 for x in k], v, width=barwidth, label=x)
+            c+=1
+
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    if title:
+        ax.set_title(title)
+
+    ax.set_ylim(top=math.ceil(max(ax.get_ylim())/0.8))
+
+    if legend:
+        for label in ax.xaxis.get_minorticklabels() + ax.xaxis.get_majorticklabels():
+            label.set_rotation(90)
+        fig.legend(loc="upper left", bbox_to_anchor=(0.05, 0.95))
+
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format='png')
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+class Renderer(object):
+    _instance = None
+
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+
+    def init(self):
+        # graph_workers: number of render processes, 0 renders in a thread
+        workers = Config.instance().get("graph_workers")
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers
+        self.pool = None
+        self.lock = threading.Lock()
+        if self.workers > 0:
+            self.pool = self.new_pool()
+        # in-flight renders are capped so a burst of graph requests queues
+        # here instead of piling up in the pool
+        self.inflight = asyncio.Semaphore(max(1, self.workers) * 2)
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        # spawn: the app process runs threads, forking it is not safe
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_style)
+
+    def replace(self, pool: ProcessPoolExecutor):
+        # a worker that died (OOM kill, segfault) breaks the whole pool; the
+        # first render that notices starts a new one
+        with self.lock:
+            if self.pool is pool:
+                logger.warning("graph render pool broken, starting a new one")
+                self.pool = self.new_pool()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, *args, **kwargs) -> bytes:
+        async with self.inflight:
+            if self.pool is None:
+                return await asyncio.to_thread(render_bar, *args, **kwargs)
+            for attempt in range(2):
+                pool = self.pool
+                try:
+                    return await asyncio.wrap_future(pool.submit(render_bar, *args, **kwargs))
+                except BrokenProcessPool:
+                    if attempt > 0:
+                        raise
+                    self.replace(pool)
+
+    def warmup(self):
+        # starts the render processes (importing matplotlib there) or imports
+        # it here when rendering in threads
+        if self.pool is None:
+            init_style()
+            return
+        wait([self.pool.submit(init_style) for _ in range(self.workers)])
+
+    def shutdown(self):
+        # waits for the (idle) workers, otherwise they outlive the server
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+class GraphCache(object):
+    _instance = None
+
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+
+    def init(self):
+        # PNGs keyed by a hash of the plotted data and render parameters: an
+        # in-memory LRU in front of a size-bounded directory
+        self.directory = "graph"
+        self.memory_limit = (Config.instance().get("graph_cache_memory") or 16) * 1024 * 1024
+        self.disk_limit = (Config.instance().get("graph_cache_disk") or 64) * 1024 * 1024
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk_size = None   # bytes in the directory, None until scanned
+        self.rendering = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *args, **kwargs) -> str:
+        payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def recall(self, key: str) -> bytes:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+        return None
+
+    def read(self, key: str) -> bytes:
+        # disk tier, blocking: fetch() runs it in a thread
+        try:
+            with open(self.path(key), "rb") as f:
+                content = f.read()
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return None
+        self.hits += 1
+        self.remember(key, content)
+        return content
+
+    def remember(self, key: str, content: bytes):
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = content
+            self.memory_size += len(content)
+            while self.memory_size > self.memory_limit and len(self.memory) > 1:
+                (_, evicted) = self.memory.popitem(last=False)
+                self.memory_size -= len(evicted)
+
+    def write(self, key: str, content: bytes):
+        # disk tier, blocking; the directory is only scanned once for its size
+        # and again when the limit is exceeded
+        os.makedirs(self.directory, exist_ok=True)
+        tmpfilename = self.path(key) + ".tmp"
+        with open(tmpfilename, "wb") as f:
+            f.write(content)
+        try:
+            replaced = os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmpfilename, self.path(key))
+        if self.disk_size is None:
+            total = sum(size for (_, size, _) in self.files())
+            with self.lock:
+                self.disk_size = total
+        else:
+            with self.lock:
+                self.disk_size += len(content) - replaced
+        if self.disk_size > self.disk_limit:
+            self.evict()
+
+    def files(self) -> list:
+        files = list()
+        for p in Path(self.directory).glob("*.png"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, p))
+        return files
+
+    def evict(self):
+        # oldest (least recently used, see os.utime in read) files go first,
+        # down to 90% of the limit so the next puts do not rescan right away
+        files = self.files()
+        total = sum(size for (_, size, _) in files)
+        for (_, size, p) in sorted(files):
+            if total <= self.disk_limit * 0.9:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+        with self.lock:
+            self.disk_size = total
+
+    async def fetch(self, key: str, render) -> bytes:
+        # cache lookup; concurrent misses for the same key share one render,
+        # which keeps running (and is stored) when the client that started it
+        # disconnects. The disk tier runs in threads, off the event loop
+        content = self.recall(key)
+        if content is None:
+            content = await asyncio.to_thread(self.read, key)
+        if content is not None:
+            return content
+        task = self.rendering.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self.render_and_store(key, render))
+            self.rendering[key] = task
+            task.add_done_callback(lambda done: self.rendering.pop(key) if self.rendering.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    async def render_and_store(self, key: str, render) -> bytes:
+        content = await render()
+        self.remember(key, content)
+        await asyncio.to_thread(self.write, key, content)
+        return content
@@ -1,23 +1,26 @@
 #!/usr/bin/env python3
 import logging, re, json, os
+import asyncio
+import cProfile
+import hashlib
+import threading
+import time
 import datetime
-from dateutil.relativedelta import relativedelta
-import math
 from fastapi import FastAPI, Request, Response, Form
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
+from contextlib import asynccontextmanager
 from fastapi.templating import Jinja2Templates
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import io
-from collections import defaultdict
 from typing import Optional
-from pathlib import Path
 
-from aid import AID
-from flightlog import FlightLog, Metadata
+from flightlog import FlightLog, Metadata, timedelta_toString
 from airports import Airports
+from cache import Cache
 from config import Config
+from graph import GraphCache, Renderer
+from metrics import Metrics, phases
+from sync import Sync
+import series
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,30 +32,8 @@ logger = logging.getLogger(__name__)
 
 notesfilename = "flightlog_merged_notes.dat"
 
-# plt.style.use('Solarize_Light2')
-plt.style.use('fast')
-
-def refresh_data():
-    for tenant in Config.instance().getTenants():
-        flightlog = FlightLog.file(tenant['name'])
-        
-        flights = flightlog.get_all()
-        if len(flights) > 0:
-            maxDate = max(flights, key=lambda x: x.sortval)
-            maxDate = datetime.datetime.fromtimestamp(maxDate.sortval)
-            
-            since = maxDate.strftime("%d.%m.%Y")
-        else: 
-            since = "1950-01-01" 
-        
-        until = datetime.datetime.now().strftime("%d.%m.%Y")
-        
-        logger.info("Refreshing %s from %s till %s" % (tenant['name'], since, until))
-        
-        aid = AID(tenant['name'],tenant['username'],tenant['password'])
-        ret = aid.get_flightlog(since, until)
-        
-        flightlog.store(ret['data'])
+# "<sortval>_<flight id>", see FlightLog.cursor()
+cursor_pattern = re.compile(r"-?[0-9]+_.+")
 
 def flight_notesId(flight):
     date = datetime.datetime.fromtimestamp(flight.sortval, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S') 
@@ -63,297 +44,299 @@ def flight_toString(flight, notes=""):
     crew = re.sub(r'<[^>]+>', '', flight.crew)
     return "%s %s [%s>>>%s] (%s) [%10s #%s] %25s | %s" % (flight.callsign, date, flight.departure, flight.destination, flight.airtime, flight.tenant, flight.flightid, crew, notes.strip())
     
-def timedelta_toString(delta : datetime.timedelta) -> str:
-    total_minutes = int(delta.total_seconds() // 60)
-    hours = total_minutes // 60
-    minutes = total_minutes % 60
-    return f"{hours:02d}:{minutes:02d}"
+def warmup():
+    # builds what the first requests would otherwise pay for: flightlogs,
+    # metadata, airports, night table, indexes, templates and render processes
+    start = time.perf_counter()
+    with Metrics.instance().span("warmup"):
+        Metadata.instance()
+        flightlog = FlightLog.cached(Config.instance().getTenants())
+        flightlog.get_statistics()
+        flightlog.get_cube()
+        flightlog.get_logbook_index()
+        flightlog.get_person_index()
+        for name in ("main.html", "rows.html", "flight.html"):
+            templates.get_template(name)
+        Renderer.instance().warmup()
+    logger.info("warm-up done in %.2fs" % (time.perf_counter() - start))
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if Config.instance().get("warmup"):
+        # in the background, requests arriving meanwhile wait for the same
+        # cached build instead of starting their own
+        Renderer.instance()
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+    Sync.instance().start()
+    yield
+    Sync.instance().stop()
+    Renderer.instance().shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    # latency per route, the phases timed by Metrics.span() as Server-Timing
+    # header; with "profiling" enabled ?profile=1 dumps a cProfile of the request
+    current = list()
+    token = phases.set(current)
+    profiler = None
+    if Config.instance().get("profiling") and request.query_params.get("profile"):
+        # profiles the event loop thread, concurrent requests show up as well
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        phases.reset(token)
+    route = request.scope.get("route")
+    route = getattr(route, "path", "unmatched")
+    Metrics.instance().observe("http_request_duration_seconds", seconds, method=request.method, route=route, status=response.status_code)
+    if current:
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={s * 1000:.1f}" for (name, s) in current + [("total", seconds)])
+    if profiler is not None:
+        os.makedirs("profile", exist_ok=True)
+        filename = os.path.join("profile", "%s-%s.pstats" % (time.strftime("%Y%m%d-%H%M%S"), re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"))
+        profiler.dump_stats(filename)
+        response.headers["X-Profile"] = filename
+        logger.info("profile written to %s" % filename)
+    return response
+
+def render(request: Request, name: str, context: dict) -> Response:
+    with Metrics.instance().span("template"):
+        return templates.TemplateResponse(request=request, name=name, context=context)
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text format
+    metrics = Metrics.instance()
+    for (name, cache) in (("flightlog", Cache.instance()), ("graph", GraphCache.instance())):
+        metrics.set("cache_hits_total", cache.hits, cache=name)
+        metrics.set("cache_misses_total", cache.misses, cache=name)
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/favicon.ico")
 def favicon():
     return FileResponse("static/favicon.ico")
 
+async def cached_flightlog():
+    # a (re)build of the merged log takes seconds on large logs and holds the
+    # cache lock, it must not block the event loop for the other requests
+    return await asyncio.to_thread(FlightLog.cached, Config.instance().getTenants())
+
+def page_airports(flights: list) -> dict:
+    return Airports.instance().subset({f.departure for f in flights} | {f.destination for f in flights})
+
+def page_context(flightlog, before: Optional[str] = None, edit: Optional[str] = None) -> dict:
+    size = Config.instance().get("page_size") or 100
+    if before:
+        start = flightlog.position(before)
+    elif edit and flightlog.get_flight(edit):
+        # the page (on the default page grid) that holds the edited flight
+        start = flightlog.position(FlightLog.cursor(flightlog.get_flight(edit))) - 1
+        start -= start % size
+    else:
+        start = 0
+    (flights, next_cursor) = flightlog.get_page(start, size)
+    return {"flights": flights, "offset": start, "next_cursor": next_cursor, "edit": edit, "airports": page_airports(flights), "home_airport": Config.instance().get("home")}
+
 @app.get("/")
-async def root(request: Request, edit: Optional[str] = None):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
-    
-    stat = {}
-    stat["blocktime"] = timedelta_toString(flightlog.get_blocktime())
-    stat["blocktime_pic"] = timedelta_toString(flightlog.get_blocktime_pic())
-    stat["blocktime_dual"] = timedelta_toString(flightlog.get_blocktime() - flightlog.get_blocktime_pic())
-    stat["blocktime_night"] = timedelta_toString(flightlog.get_blocktime_night())
-    stat["airtime"] = timedelta_toString(flightlog.get_airtime())
-    stat["landings"] = flightlog.get_landings()
-    stat["aircraft"] = ", ".join(flightlog.get_aircraft_types())
-    stat["noflights"] = len(flightlog.get_all())
+async def root(request: Request, edit: Optional[str] = None, before: Optional[str] = None):
+    if before and not cursor_pattern.fullmatch(before):
+        return Response(status_code=400)
+    flightlog = await cached_flightlog()
+    stat = flightlog.get_statistics()
     
-    now = datetime.datetime.now()
-    if len(flightlog.flights) > 0:
-        max_delta = relativedelta(now, flightlog.min.date)
-        alltime = max_delta.years*12+max_delta.months+1
-    else: 
-        alltime = 1
-
-    stat["avg_blocktimes"] = list()
-    stat["avg_pictimes"] = list()
-    stat["avg_dualtimes"] = list()
-    stat["avg_nighttimes"] = list()
-    
-    for x in [alltime,12,6,3,1]:
-        from_date = now - relativedelta(months=x)
-        flights = flightlog.get_flights_by_date_period(from_date, now)
-        time = datetime.timedelta(0)
-        pictime = datetime.timedelta(0)
-        dualtime = datetime.timedelta(0)
-        nighttime = datetime.timedelta(0)
-        for flight in flights:
-            time += flight.getBlocktime()
-            if flight.isPIC():
-                pictime += flight.getBlocktime()
-            if not flight.isPIC():
-                dualtime += flight.getBlocktime()
-            if flight.isNight():
-                nighttime += flight.getBlocktime()
-                
-        average = f"{int(time.total_seconds()/x//3600)}:{int(time.total_seconds()/x%3600//60):02d}"
-        picaverage = f"{int(pictime.total_seconds()/x//3600)}:{int(pictime.total_seconds()/x%3600//60):02d}"
-        dualaverage = f"{int(dualtime.total_seconds()/x//3600)}:{int(dualtime.total_seconds()/x%3600//60):02d}"
-        nightaverage = f"{int(nighttime.total_seconds()/x//3600)}:{int(nighttime.total_seconds()/x%3600//60):02d}"
-        
-        stat["avg_blocktimes"].append(average)
-        stat["avg_pictimes"].append(picaverage)
-        stat["avg_dualtimes"].append(dualaverage)
-        stat["avg_nighttimes"].append(nightaverage)
-    
-    return templates.TemplateResponse(
-        request=request, name="main.html", context={"flightlog": flightlog, "statistics": stat, "edit": edit, "airports": Airports.instance().airports, "home_airport": Config.instance().get("home")}
+    context = page_context(flightlog, before, edit)
+    context.update({"flightlog": flightlog, "statistics": stat})
+    return render(
+        request=request, name="main.html", context=context
     )
+
+@app.get("/rows")
+async def rows(request: Request, before: Optional[str] = None, edit: Optional[str] = None):
+    # table fragments: the next page after a cursor, or a single row in edit mode
+    if before and not cursor_pattern.fullmatch(before):
+        return Response(status_code=400)
+    flightlog = await cached_flightlog()
+    if edit and not before:
+        flight = flightlog.get_flight(edit)
+        if flight is None:
+            return Response(status_code=404)
+        start = flightlog.position(FlightLog.cursor(flight)) - 1
+        context = {"flights": [flight], "offset": start, "next_cursor": None, "edit": edit, "airports": page_airports([flight]), "home_airport": Config.instance().get("home")}
+    else:
+        context = page_context(flightlog, before, edit)
+    return render(request=request, name="rows.html", context=context)
     
 @app.post("/submit")
 async def submit(request: Request, flightid: str = Form(), comment: str = Form(), pax: str = Form()):
     logger.info(f"{flightid}: {comment}")
     
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
-    Metadata.instance().add_metadata(flightid, "comment", comment)
-    Metadata.instance().add_metadata(flightid, "pax", pax)
+    Metadata.instance().update_metadata(flightid, {"comment": comment, "pax": pax})
+    (await cached_flightlog()).invalidate_metadata(flightid)
     
     return RedirectResponse(url="/", status_code=303)
     
 @app.get("/flight/{flight_id}")
 async def get_flight(request: Request, flight_id: str):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+    flightlog = await cached_flightlog()
     flight = flightlog.get_flight(flight_id)
+    if flight is None:
+        return Response(status_code=404)
     
-    flightlog.cut(flight_id)
+    # running totals up to this flight, a lookup in the prefix sums
+    totals = flightlog.get_logbook_sums(flight_id)
     
-    blocktime = timedelta_toString(flightlog.get_blocktime())
-    ldg = flightlog.get_landings()
-    blocktime_night = timedelta_toString(flightlog.get_blocktime_night())
-    blocktime_pic = timedelta_toString(flightlog.get_blocktime_pic())
-    blocktime_dual = timedelta_toString(flightlog.get_blocktime_dual())
+    blocktime = timedelta_toString(datetime.timedelta(minutes=totals["blocktime"]))
+    ldg = (totals["landings"], totals["landings_pic"], totals["landings_night"], totals["landings_nightpic"])
+    blocktime_night = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_night"]))
+    blocktime_pic = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_pic"]))
+    blocktime_dual = timedelta_toString(datetime.timedelta(minutes=totals["blocktime_dual"]))
     
     logbook = f"Blockzeit: {blocktime} | Landungen: {ldg[0]} (Tag: {ldg[0]-ldg[2]} / Nacht: {ldg[2]}) | Nacht: {blocktime_night} | PIC: {blocktime_pic} | Dual: {blocktime_dual}"
     
-    return templates.TemplateResponse(
+    return render(
         request=request, name="flight.html", context={"flight": flight, "logbook": logbook}
     )
 
 @app.get("/refresh")
-async def root(request: Request):
-    logger.info("refreshing data...")
-    refresh_data()
-    for p in Path(".").glob("graph-*.png"):
-        p.unlink()
-    return RedirectResponse(url="/")
-
-def graph_bar(keys : list, values : dict, title : str, xlabel : str = None, ylabel : str = None, stacked : bool = True, barwidth : float = 0.9, legend : bool = True, xdates : bool = False) -> Response:
-    filename = f"graph/graph-{title.replace(' ', '-').replace('/', '-').lower()}.png"
-    
-    logger.info(filename)
-    
-    if os.path.exists(filename):
-        return FileResponse(filename)
-    
-    fig, ax = plt.subplots(figsize=(10, 6), constrained_layout=True)
-    
-    if xdates:
-        keys = [datetime.datetime.strptime(date, '%Y-%m').date() for date in keys]
-        plt.gca().xaxis.set_minor_formatter(mdates.DateFormatter('%b'))
-        plt.gca().xaxis.set_minor_locator(mdates.MonthLocator())
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%b'))
-        plt.gca().xaxis.set_major_locator(mdates.YearLocator())
-        # plt.gcf().autofmt_xdate()
-        barwidth = 25
-    else: 
-        ax.set_xticks(list(range(len(keys))))
-        ax.set_xticklabels(keys, rotation=45)
+async def refresh(request: Request):
+    # only enqueues the sync, progress is reported by /refresh/status
+    job = Sync.instance().submit()
+    logger.info("refreshing data (job %s)..." % job)
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({"job": job, "status": f"/refresh/status?job={job}"}, status_code=202)
+    return RedirectResponse(url="/", headers={"X-Refresh-Job": job})
+
+@app.get("/refresh/status")
+async def refresh_status(request: Request, job: Optional[str] = None):
+    status = Sync.instance().status(job)
+    if status is None:
+        return JSONResponse({"error": f"unknown job {job}"}, status_code=404)
+    return JSONResponse(status)
+
+async def graph_bar(request : Request, keys : list, values : dict, title : str, xlabel : str = None, ylabel : str = None, stacked : bool = True, barwidth : float = 0.9, legend : bool = True, xdates : bool = False) -> Response:
+    # rendered in a worker process, arguments must be picklable
+    keys = list(keys)
+    values = {k: list(v) for k, v in values.items()}
+    options = dict(xlabel=xlabel, ylabel=ylabel, stacked=stacked, barwidth=barwidth, legend=legend, xdates=xdates)
     
-    if stacked:
-        bottom = [0] * len(next(iter(values.values())))
-        for x, v in values.items():
-            ax.bar(keys, v, width=barwidth, label=x, bottom=bottom)
-            bottom = [a + b for a, b in zip(bottom, v)]
-    else:
-        barwidth = barwidth / len(values)
-        width = len(values) * barwidth
-        c = 1
-        for x, v in values.items():
-            k = list(range(len(v)))
-            ax.bar([x-width/2+c*barwidth-barwidth/2 for x in k], v, width=barwidth, label=x)
-            c+=1
-        
-    if xlabel:
-        ax.set_xlabel(xlabel)
-    if ylabel:
-        ax.set_ylabel(ylabel)
-    if title: 
-        ax.set_title(title)
-        
-    ax.set_ylim(top=math.ceil(max(ax.get_ylim())/0.8))
-
-    if legend:
-        # plt.xticks(rotation=90)
-        plt.setp(ax.xaxis.get_minorticklabels(), rotation=90)
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=90)
-        fig.legend(loc="upper left", bbox_to_anchor=(0.05, 0.95))
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0) 
+    # content addressed: new data or parameters give a new key, so cached
+    # images never go stale and the key doubles as a strong ETag
+    cache = GraphCache.instance()
+    key = cache.key(keys, values, title, **options)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "no-cache"}
     
-    if not os.path.exists("graph"):
-        os.mkdir("graph")
+    if request.headers.get("if-none-match") in (f'"{key}"', f'W/"{key}"'):
+        return Response(status_code=304, headers=headers)
     
-    with open(filename, 'wb') as file:
-        file.write(buf.getbuffer())
+    with Metrics.instance().span("graph"):
+        content = await cache.fetch(key, lambda: Renderer.instance().render(keys, values, title, **options))
+    return Response(content=content, media_type="image/png", headers=headers)
 
-    return Response(content=buf.read(), media_type="image/png", headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
+def under_construction() -> Response:
+    return FileResponse('static/under-construction.png', headers={
+        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+        "Pragma": "no-cache",
+        "Expires": "0"})
 
 @app.get("/graph/blocktimes")
 async def get_graph_blocktimes(request: Request, aircraft : str = None):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+    flightlog = await cached_flightlog()
     if len(flightlog.flights) <=0:
-        return FileResponse('static/under-construction.png', headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
-    (_, grouped) = flightlog.get_flights_groupedby_month(aircraft)
-    
-    # accumulate blocktimes
-    blocktimes = defaultdict(datetime.timedelta)
-    for k,v in grouped.items():
-        time = datetime.timedelta(0)
-        for flight in v:
-            blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-            delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-            time += delta
-        blocktimes[k] = time
-    
-    # prepare keys and values
-    dates = [f"{year}-{month:02d}" for (year, month) in blocktimes.keys()]
-    values = [x.total_seconds()/3600 for x in blocktimes.values()]
-  
-    return graph_bar(dates, {"values": values}, title="Blocktimes", xlabel="Date", ylabel="Blocktime [h]", legend=False, xdates=True)
+        return under_construction()
+    (dates, values) = series.blocktimes(flightlog, aircraft)
+    return await graph_bar(request, dates, values, title="Blocktimes", xlabel="Date", ylabel="Blocktime [h]", legend=False, xdates=True)
 
 @app.get("/graph/other")
 async def get_graph_other(request: Request, stacked : bool = True):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+    flightlog = await cached_flightlog()
     if len(flightlog.flights) <=0:
-        return FileResponse('static/under-construction.png', headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
-    grouped = flightlog.get_flights_groupedby_person()
-
-    blocktimes = defaultdict()
-    for person, data in grouped.items():
-        time = datetime.timedelta(0)
-        for flight in data:
-            blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-            delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-            time += delta
-        person = "Nicht-FFG" if len(person) <= 0 else person
-        blocktimes[person] = time
-        
-    blocktimes = dict(sorted(blocktimes.items(), key=lambda item: item[1].total_seconds(), reverse=True))
-            
-    persons = blocktimes.keys()
-    values = [x.total_seconds()/3600 for x in blocktimes.values()]
-    
-    return graph_bar(persons, {"a": values}, xlabel="Crew", ylabel="Blocktime [hours]", stacked=stacked, title="FFG Mitflieger / Lehrer", legend=False)
+        return under_construction()
+    (persons, values) = series.persons(flightlog)
+    return await graph_bar(request, persons, values, xlabel="Crew", ylabel="Blocktime [hours]", stacked=stacked, title="FFG Mitflieger / Lehrer", legend=False)
 
 @app.get("/graph/bt_ac")
-async def get_graph_blocktimes(request: Request, pic: Optional[bool] = None):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+async def get_graph_bt_ac(request: Request, pic: Optional[bool] = None):
+    flightlog = await cached_flightlog()
     if len(flightlog.flights) <=0:
-        return FileResponse('static/under-construction.png', headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
-    aircrafts = flightlog.get_aircraft_types()
-    (all_months, grouped) = flightlog.get_flights_groupedby_month(f_pic=pic)
-    
-    data = dict()
-    for ac in sorted(aircrafts): 
-        data[ac] = list()
-        for month in all_months:
-            time = datetime.timedelta(0)
-            for flight in grouped[month.year,month.month]:
-                if flight.actype == ac:
-                    blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-                    delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-                    time += delta
-            data[ac].append(time.total_seconds()/3600)
-    
-    all_months = [f"{month.year}-{month.month:02d}" for month in all_months]
+        return under_construction()
+    (all_months, data) = series.by_month(flightlog, "actype", pic)
     title = "Blocktimes by Aircraft" if not pic else "Blocktimes by Aircraft (PIC)"
-    return graph_bar(all_months, data, title=title, xlabel="Date", ylabel="Blocktime [h]", xdates=True)
+    return await graph_bar(request, all_months, data, title=title, xlabel="Date", ylabel="Blocktime [h]", xdates=True)
 
 @app.get("/graph/bt_cs")
-async def get_graph_blocktimes(request: Request, pic: Optional[bool] = None):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+async def get_graph_bt_cs(request: Request, pic: Optional[bool] = None):
+    flightlog = await cached_flightlog()
     if len(flightlog.flights) <=0:
-        return FileResponse('static/under-construction.png', headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
-    aircrafts = flightlog.get_callsigns()
-    (all_months, grouped) = flightlog.get_flights_groupedby_month(f_pic=pic)
-    
-    data = dict()
-    for ac in sorted(aircrafts): 
-        data[ac] = list()
-        for month in all_months:
-            time = datetime.timedelta(0)
-            for flight in grouped[month.year,month.month]:
-                if flight.callsign == ac:
-                    blocktime = datetime.datetime.strptime(flight.blocktime, "%H:%M")
-                    delta = datetime.timedelta(hours=blocktime.hour, minutes=blocktime.minute)
-                    time += delta
-            data[ac].append(time.total_seconds()/3600)
-    
-    all_months = [f"{month.year}-{month.month:02d}" for month in all_months]
-    return graph_bar(all_months, data, title="Blocktimes by Callsign", xlabel="Date", ylabel="Blocktime [h]", xdates=True)
+        return under_construction()
+    (all_months, data) = series.by_month(flightlog, "callsign", pic)
+    return await graph_bar(request, all_months, data, title="Blocktimes by Callsign", xlabel="Date", ylabel="Blocktime [h]", xdates=True)
 
 @app.get("/graph/airports")
 async def get_graph_airports(request: Request):
-    flightlog = FlightLog.virtual(Config.instance().getTenants())
+    flightlog = await cached_flightlog()
     if len(flightlog.flights) <=0:
-        return FileResponse('static/under-construction.png', headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0"})
-    airports = flightlog.get_airports()
-    airports = dict(sorted(airports.items(), key=lambda x: x[1], reverse=True))
-    return graph_bar(airports.keys(),{"a": airports.values()},"Airports", legend=False)
+        return under_construction()
+    (airports, values) = series.airports(flightlog)
+    return await graph_bar(request, airports, values, "Airports", legend=False)
+
+def series_response(request: Request, title: str, keys: list, values: dict, unit: str) -> Response:
+    # compact JSON with a strong ETag over the body, answered with 304 when
+    # the client already has it
+    payload = {
+        "title": title,
+        "unit": unit,
+        "keys": list(keys),
+        "series": {name: [round(v, 3) for v in data] for name, data in values.items()},
+    }
+    body = json.dumps(payload, separators=(",", ":"))
+    etag = '"%s"' % hashlib.sha256(body.encode()).hexdigest()[:32]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") in (etag, "W/" + etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/series/blocktimes")
+async def get_series_blocktimes(request: Request, aircraft : str = None):
+    flightlog = await cached_flightlog()
+    (dates, values) = series.blocktimes(flightlog, aircraft)
+    return series_response(request, "Blocktimes", dates, values, "h")
+
+@app.get("/api/series/other")
+async def get_series_other(request: Request):
+    flightlog = await cached_flightlog()
+    (persons, values) = series.persons(flightlog)
+    return series_response(request, "FFG Mitflieger / Lehrer", persons, values, "h")
+
+@app.get("/api/series/bt_ac")
+async def get_series_bt_ac(request: Request, pic: Optional[bool] = None):
+    flightlog = await cached_flightlog()
+    (all_months, data) = series.by_month(flightlog, "actype", pic)
+    title = "Blocktimes by Aircraft" if not pic else "Blocktimes by Aircraft (PIC)"
+    return series_response(request, title, all_months, data, "h")
+
+@app.get("/api/series/bt_cs")
+async def get_series_bt_cs(request: Request, pic: Optional[bool] = None):
+    flightlog = await cached_flightlog()
+    (all_months, data) = series.by_month(flightlog, "callsign", pic)
+    return series_response(request, "Blocktimes by Callsign", all_months, data, "h")
+
+@app.get("/api/series/airports")
+async def get_series_airports(request: Request):
+    flightlog = await cached_flightlog()
+    (airports, values) = series.airports(flightlog)
+    return series_response(request, "Airports", airports, values, "flights")
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
\ No newline at end of file
@@ -2,6 +2,9 @@ import json
 from collections import defaultdict
 import logging
 import os
+import threading
+
+from metrics import Metrics
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,21 +28,60 @@ class Metadata(object):
         return cls._instance
     
     def load_metadata(self):
+        # data/metadata.dat is the last compacted snapshot, every change since
+        # then is one JSON line in data/metadata.journal
         self.metafilename = "data/metadata.dat"
+        self.journalfilename = "data/metadata.journal"
+        self.journal_limit = 1000
+        self.journal_entries = 0
+        self.lock = threading.Lock()
+        self.metadata = defaultdict()
         if os.path.exists(self.metafilename):
             with open(self.metafilename, "r") as f:
                 file_contents = f.read()
                 if len(file_contents) > 0:
                     self.metadata = json.loads(file_contents)
                     logger.info("metadata loaded.")
+        self.replay_journal()
+    
+    def replay_journal(self):
+        if not os.path.exists(self.journalfilename):
+            return
+        with open(self.journalfilename, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn last line after a crash, the change was never
+                    # acknowledged; compact so new entries are not appended to it
+                    logger.warning("ignoring incomplete metadata journal entry")
+                    self.compact()
                     return
-        self.metadata = defaultdict()
+                self.apply(entry["flightid"], entry["values"])
+                self.journal_entries += 1
+        logger.info("metadata journal replayed (%d entries)." % self.journal_entries)
     
-    def add_metadata(self, flightid: str, attribute: str, value: str):
+    def apply(self, flightid: str, values: dict):
         if not flightid in self.metadata:
             self.metadata[flightid] = dict()
-        self.metadata[flightid][attribute] = value
-        self.write_metadata()
+        self.metadata[flightid].update(values)
+    
+    def add_metadata(self, flightid: str, attribute: str, value: str):
+        self.update_metadata(flightid, {attribute: value})
+    
+    def update_metadata(self, flightid: str, values: dict):
+        # one journal line and one fsync per call, however many attributes
+        with self.lock, Metrics.instance().span("metadata_write"):
+            self.apply(flightid, values)
+            if not os.path.exists("data/"):
+                os.mkdir("data")
+            with open(self.journalfilename, "a") as f:
+                f.write(json.dumps({"flightid": flightid, "values": values}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries += 1
+            if self.journal_entries >= self.journal_limit:
+                self.compact()
         
     def get_metadata(self, flightid: str):
         if not flightid in self.metadata:
@@ -47,8 +89,22 @@ class Metadata(object):
         return self.metadata[flightid]
         
     def write_metadata(self):
+        with self.lock:
+            self.compact()
+    
+    def compact(self):
+        # atomic snapshot (temp file + rename), then start a new journal
         if not os.path.exists("data/"):
             os.mkdir("data")
-            
-        with open(self.metafilename, "w") as f:
-            f.write(json.dumps(self.metadata))
\ No newline at end of file
+        
+        tmpfilename = self.metafilename + ".tmp"
+        with Metrics.instance().span("metadata_compact"):
+            with open(tmpfilename, "w") as f:
+                f.write(json.dumps(self.metadata))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpfilename, self.metafilename)
+        if os.path.exists(self.journalfilename):
+            os.remove(self.journalfilename)
+        self.journal_entries = 0
+        logger.info("metadata compacted.")
@@ -0,0 +1,113 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "aidtool_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# (span name, seconds) of the request being handled, see Metrics.span()
+phases = contextvars.ContextVar("phases", default=None)
+
+def labelstring(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join('%s="%s"' % (k, escape(v)) for k, v in labels) + "}"
+
+class Metrics(object):
+    _instance = None
+
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+
+    def init(self):
+        self.lock = threading.Lock()
+        self.help = {
+            "http_request_duration_seconds": ("histogram", "HTTP request latency by route and status"),
+            "span_seconds": ("histogram", "Time spent in instrumented phases"),
+            "cache_hits_total": ("counter", "Cache hits"),
+            "cache_misses_total": ("counter", "Cache misses"),
+            "refresh_total": ("counter", "Tenant refreshes by result"),
+            "refresh_flights_added_total": ("counter", "Flights added by refreshes"),
+        }
+        self.counters = dict()      # (name, labels) -> value
+        self.histograms = dict()    # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        # counters kept elsewhere (e.g. Cache.hits) are mirrored before a scrape
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    @contextmanager
+    def span(self, name: str):
+        # times a phase into the span histogram and, inside a request, into
+        # its Server-Timing header
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("span_seconds", seconds, span=name)
+            current = phases.get()
+            if current is not None:
+                current.append((name, seconds))
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines = list()
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        described = set()
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            (kind, text) = self.help.get(name, (kind, name))
+            lines.append("# HELP %s%s %s" % (PREFIX, name, text))
+            lines.append("# TYPE %s%s %s" % (PREFIX, name, kind))
+        for ((name, labels), value) in counters:
+            header(name, "counter")
+            lines.append("%s%s%s %s" % (PREFIX, name, labelstring(labels), value))
+        for ((name, labels), histogram) in histograms:
+            header(name, "histogram")
+            for i, bound in enumerate(BUCKETS):
+                lines.append("%s%s_bucket%s %d" % (PREFIX, name, labelstring(labels + (("le", bound),)), histogram[i]))
+            lines.append("%s%s_bucket%s %d" % (PREFIX, name, labelstring(labels + (("le", "+Inf"),)), histogram[-1]))
+            lines.append("%s%s_sum%s %s" % (PREFIX, name, labelstring(labels), histogram[-2]))
+            lines.append("%s%s_count%s %d" % (PREFIX, name, labelstring(labels), histogram[-1]))
+        return "\n".join(lines) + "\n"
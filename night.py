@@ -0,0 +1,86 @@
+import datetime
+import logging
+import threading
+from astral.sun import Observer, dusk
+
+from airports import Airports
+from metrics import Metrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()] 
+)
+
+logger = logging.getLogger(__name__)
+
+class Night(object):
+    _instance = None 
+    
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+    
+    @classmethod 
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+    
+    def init(self):
+        self.lock = threading.Lock()
+        # (icao, date) -> civil dusk in UTC, never changes so it is kept for
+        # the lifetime of the process
+        self.dusks = dict()
+        self.unknown = set()
+    
+    def observer(self, icao: str) -> Observer:
+        airport = Airports.instance().get(icao)
+        return airport.observer if airport is not None else None
+    
+    def dusk(self, icao: str, date: datetime.date) -> datetime.datetime:
+        # None for unknown airports and days without civil dusk (high
+        # latitude summer), such flights are not counted as night
+        key = (icao, date)
+        if not key in self.dusks:
+            with self.lock:
+                if not key in self.dusks:
+                    observer = self.observer(icao)
+                    if observer is None:
+                        if not icao in self.unknown:
+                            self.unknown.add(icao)
+                            logger.warning("unknown airport %s, flights from/to it are not classified as night" % icao)
+                        self.dusks[key] = None
+                    else:
+                        try:
+                            self.dusks[key] = dusk(observer, date)
+                        except ValueError as e:
+                            logger.info("no dusk at %s on %s: %s" % (icao, date, e))
+                            self.dusks[key] = None
+        return self.dusks[key]
+    
+    def time(self, date: datetime.date, hhmm: str) -> datetime.datetime:
+        (hours, minutes) = hhmm.split(":")
+        return datetime.datetime(date.year, date.month, date.day, int(hours), int(minutes), tzinfo=datetime.timezone.utc)
+    
+    def is_night(self, flight) -> bool:
+        date = flight.date.date()
+        blockoff = self.time(date, flight.blockoff)
+        blockon = self.time(date, flight.blockon)
+        (departure, destination) = (self.dusk(flight.departure, date), self.dusk(flight.destination, date))
+        if departure is None or destination is None:
+            return False
+        return blockoff > departure and blockon > destination
+    
+    def precompute(self, flights: list):
+        # evaluate each (airport, date) pair once, then classify every flight
+        # from the table; flights loaded from a snapshot are already classified
+        flights = [f for f in flights if f.night is None]
+        with Metrics.instance().span("night"):
+            for flight in flights:
+                date = flight.date.date()
+                self.dusk(flight.departure, date)
+                self.dusk(flight.destination, date)
+            for flight in flights:
+                flight.night = self.is_night(flight)
+        logger.debug("night table: %d entries" % len(self.dusks))
@@ -0,0 +1,98 @@
+import logging
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+class Persons(object):
+    _instance = None
+
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+
+    @classmethod
+    def of(cls, flightlog):
+        # a private index over a single log, not shared
+        persons = cls.__new__(cls)
+        persons.init()
+        return persons.reconcile(flightlog)
+
+    def init(self):
+        # inverted index over crew and pax, kept across flightlog rebuilds and
+        # only updated for the flights that changed
+        self.lock = threading.Lock()
+        self.flights = dict()   # flight id -> (persons, block minutes, sortval)
+        self.persons = dict()   # person -> {flight id: block minutes}
+        self.blocktimes = dict()    # person -> total block minutes
+
+    def names(self, flight) -> tuple:
+        names = [person.strip() for person in flight.getCrew()]
+        names += [person.strip() for person in flight.getPax()]
+        return tuple(dict.fromkeys(names))
+
+    def add(self, flight_id: str, names: tuple, minutes: int, sortval: int):
+        self.flights[flight_id] = (names, minutes, sortval)
+        for person in names:
+            self.persons.setdefault(person, dict())[flight_id] = minutes
+            self.blocktimes[person] = self.blocktimes.get(person, 0) + minutes
+
+    def remove(self, flight_id: str):
+        (names, minutes, _) = self.flights.pop(flight_id)
+        for person in names:
+            del self.persons[person][flight_id]
+            self.blocktimes[person] -= minutes
+            if not self.persons[person]:
+                del self.persons[person]
+                del self.blocktimes[person]
+
+    def update(self, flight):
+        # called when the crew or pax of a flight may have changed
+        with self.lock:
+            flight_id = flight.getID()
+            if flight_id in self.flights:
+                self.remove(flight_id)
+            self.add(flight_id, self.names(flight), flight.blockminutes, flight.sortval)
+
+    def reconcile(self, flightlog):
+        # bring the index in line with a (rebuilt) log: only flights that were
+        # stored or dropped since the last call are looked at
+        with self.lock:
+            ids = flightlog.index.keys()
+            removed = self.flights.keys() - ids
+            added = ids - self.flights.keys()
+            for flight_id in removed:
+                self.remove(flight_id)
+            for flight_id in added:
+                flight = flightlog.index[flight_id]
+                self.add(flight_id, self.names(flight), flight.blockminutes, flight.sortval)
+            if removed or added:
+                logger.debug("person index: %d added, %d removed" % (len(added), len(removed)))
+        return self
+
+    def flights_with(self, person: str) -> list:
+        # ids of the flights with person in the crew or pax, newest first
+        with self.lock:
+            ids = list(self.persons.get(person, dict()).keys())
+            return sorted(ids, key=lambda flight_id: self.flights[flight_id][2], reverse=True)
+
+    def blocktime(self, person: str) -> int:
+        return self.blocktimes.get(person, 0)
+
+    def get_blocktimes(self) -> dict:
+        # person -> block minutes, the most recently seen persons first
+        with self.lock:
+            newest = {person: max(self.flights[flight_id][2] for flight_id in flights) for person, flights in self.persons.items()}
+            order = sorted(self.blocktimes.keys(), key=lambda person: newest[person], reverse=True)
+            return {person: self.blocktimes[person] for person in order}
@@ -0,0 +1,67 @@
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()] 
+)
+
+logger = logging.getLogger(__name__)
+
+# Aggregated chart data, shared by the /graph/* PNGs and the /api/series/*
+# JSON endpoints. Every function returns (keys, {series name: values}) with
+# values in hours (or counts) and is memoized on the flightlog.
+
+def hours(minutes: int) -> float:
+    return minutes * 60 / 3600
+
+def months(cube_months: list) -> list:
+    return [f"{year}-{month:02d}" for (year, month) in cube_months]
+
+def blocktimes(flightlog, aircraft: str = None):
+    def build():
+        cube = flightlog.get_cube()
+        if cube is not None:
+            (dates, values) = cube.slice("blocktime", aircraft=aircraft)
+            return (months(dates), {name: [hours(x) for x in v] for name, v in values.items()} or {"values": []})
+        (_, grouped) = flightlog.get_flights_groupedby_month(aircraft)
+        dates = [f"{year}-{month:02d}" for (year, month) in grouped.keys()]
+        values = [hours(sum(f.blockminutes for f in flights)) for flights in grouped.values()]
+        return (dates, {"values": values})
+    return flightlog.memoize(("blocktimes", aircraft), build)
+
+def persons(flightlog):
+    def build():
+        blocktimes = dict()
+        for person, minutes in flightlog.get_person_index().get_blocktimes().items():
+            person = "Nicht-FFG" if len(person) <= 0 else person
+            blocktimes[person] = minutes
+        blocktimes = dict(sorted(blocktimes.items(), key=lambda item: item[1], reverse=True))
+        return (list(blocktimes.keys()), {"a": [hours(x) for x in blocktimes.values()]})
+    return flightlog.memoize(("persons",), build)
+
+def by_month(flightlog, field: str, pic: bool = None):
+    # blocktime per month, one series per value of field (actype or callsign)
+    def build():
+        cube = flightlog.get_cube()
+        if cube is not None:
+            (all_months, data) = cube.slice("blocktime", by=field, pic=True if pic else None)
+            return (months(all_months), {name: [hours(x) for x in v] for name, v in data.items()})
+        (all_months, grouped) = flightlog.get_flights_groupedby_month(f_pic=pic)
+        if all_months is None:
+            return (list(), dict())
+        names = flightlog.get_aircraft_types() if field == "actype" else flightlog.get_callsigns()
+        data = dict()
+        for name in sorted(names):
+            data[name] = list()
+            for month in all_months:
+                minutes = sum(f.blockminutes for f in grouped[month] if getattr(f, field) == name)
+                data[name].append(hours(minutes))
+        return (months(all_months), data)
+    return flightlog.memoize(("by_month", field, bool(pic)), build)
+
+def airports(flightlog):
+    def build():
+        airports = dict(sorted(flightlog.get_airports().items(), key=lambda x: x[1], reverse=True))
+        return (list(airports.keys()), {"a": list(airports.values())})
+    return flightlog.memoize(("airports",), build)
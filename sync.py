@@ -0,0 +1,273 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from aid import AID
+from config import Config
+from flightlog import FlightLog
+from metrics import Metrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+logger = logging.getLogger(__name__)
+
+def store_stream(flightlog, flights, lock, batch: int = 500) -> int:
+    # hand flights to storage in small batches while the response is parsed
+    added = 0
+    pending = list()
+    for flight in flights:
+        pending.append(flight)
+        if len(pending) >= batch:
+            with lock:
+                added += flightlog.store(pending)
+            pending = list()
+    if pending:
+        with lock:
+            added += flightlog.store(pending)
+    return added
+
+def backfill_file(tenant: str) -> str:
+    return 'data/backfill_%s.json' % tenant
+
+def pending_windows(tenant: str) -> list:
+    # backfill windows that have not been fetched completely yet
+    try:
+        with open(backfill_file(tenant)) as f:
+            return [tuple(window) for window in json.load(f)["windows"]]
+    except FileNotFoundError:
+        return list()
+
+def save_windows(tenant: str, windows: list):
+    filename = backfill_file(tenant)
+    if not windows:
+        if os.path.exists(filename):
+            os.remove(filename)
+        return
+    if not os.path.exists("data/"):
+        os.mkdir("data")
+    with open(filename + ".tmp", "w") as f:
+        json.dump({"windows": sorted(windows, key=lambda w: datetime.datetime.strptime(w[0], "%d.%m.%Y"))}, f)
+    os.replace(filename + ".tmp", filename)
+
+def backfill(flightlog, aid, windows: list) -> int:
+    # yearly windows fetched in parallel; each one stays in
+    # data/backfill_<tenant>.json until it was stored completely, so a failed
+    # window is retried by the next refresh instead of leaving a hole
+    workers = Config.instance().get("backfill_workers") or 4
+    logger.info("Backfilling %s in %d windows" % (flightlog.tenant, len(windows)))
+    pending = set(windows)
+    save_windows(flightlog.tenant, pending)
+
+    lock = threading.Lock()
+    def fetch(window) -> int:
+        added = store_stream(flightlog, aid.iter_flightlog(*window), lock)
+        with lock:
+            pending.discard(window)
+            save_windows(flightlog.tenant, pending)
+        return added
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as executor:
+        futures = [executor.submit(fetch, window) for window in windows]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        logger.error("Backfilling %s: %d of %d windows failed, retried on the next refresh" % (flightlog.tenant, len(errors), len(windows)))
+        raise errors[0]
+    return sum(f.result() for f in futures)
+
+def refresh_tenant(tenant, timeout=None) -> int:
+    flightlog = FlightLog.file(tenant['name'])
+    # aid_url (per tenant or global) points the client at another server,
+    # e.g. the stand-in from bench/aid_stub.py
+    url = tenant.get("aid_url") or Config.instance().get("aid_url")
+    aid = AID.client(tenant['name'],tenant['username'],tenant['password'], timeout=timeout, url=url)
+    until = datetime.datetime.now()
+
+    windows = pending_windows(tenant['name'])
+    flights = flightlog.get_all()
+    if len(flights) <= 0 and not windows:
+        # full history of an empty tenant
+        since = Config.instance().get("backfill_since") or "01.01.1950"
+        since = datetime.datetime.strptime(since, "%d.%m.%Y").date()
+        return backfill(flightlog, aid, AID.windows(since, until.date(), months=12))
+
+    added = 0
+    if windows:
+        added += backfill(flightlog, aid, windows)
+    if len(flights) <= 0:
+        return added
+
+    # the API only takes dates, the day of the newest flight is fetched
+    # again and its flights are dropped by store()
+    maxDate = datetime.datetime.fromtimestamp(flightlog.max.sortval)
+    since = maxDate.strftime("%d.%m.%Y")
+    until = until.strftime("%d.%m.%Y")
+
+    logger.info("Refreshing %s from %s till %s" % (tenant['name'], since, until))
+
+    return added + store_stream(flightlog, aid.iter_flightlog(since, until), threading.Lock())
+
+def refresh_data() -> dict:
+    # synchronous refresh of all tenants through the shared worker pool;
+    # returns tenant name -> flights added or the error
+    sync = Sync.instance()
+    with Metrics.instance().span("refresh_data"):
+        return sync.wait(sync.submit(), sync.timeout())
+
+class Sync(object):
+    _instance = None
+
+    def __init__(self):
+        raise RuntimeError('Call instance() instead')
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls.__new__(cls)
+            cls._instance.init()
+        return cls._instance
+
+    def init(self):
+        workers = Config.instance().get("refresh_workers") or 4
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="refresh")
+        self.running = dict()       # tenant name -> future of the in-flight run
+        self.tenants = dict()       # tenant name -> status of the last runs
+        self.jobs = OrderedDict()   # job id -> {"created": ..., "futures": {tenant name: future}}
+        self.max_jobs = 100
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def timeout(self) -> int:
+        return Config.instance().get("refresh_timeout") or 60
+
+    def interval(self, tenant) -> int:
+        # seconds between background runs, per tenant or global; 0/None disables
+        if "refresh_interval" in tenant:
+            return tenant["refresh_interval"]
+        return Config.instance().get("refresh_interval")
+
+    def run_tenant(self, tenant) -> int:
+        name = tenant['name']
+        status = self.tenants[name]
+        status["last_run"] = datetime.datetime.now().isoformat(timespec="seconds")
+        start = time.monotonic()
+        try:
+            with Metrics.instance().span("refresh_tenant"):
+                added = refresh_tenant(tenant, self.timeout())
+            status["last_success"] = datetime.datetime.now().isoformat(timespec="seconds")
+            status["last_added"] = added
+            status["last_error"] = None
+            logger.info("Refreshed %s: %d new flights" % (name, added))
+            Metrics.instance().inc("refresh_total", tenant=name, result="success")
+            Metrics.instance().inc("refresh_flights_added_total", added, tenant=name)
+            return added
+        except Exception as e:
+            status["last_error"] = str(e)
+            Metrics.instance().inc("refresh_total", tenant=name, result="failure")
+            logger.error("Refreshing %s failed: %s" % (name, e))
+            raise
+        finally:
+            status["last_duration"] = round(time.monotonic() - start, 3)
+            with self.lock:
+                self.running.pop(name, None)
+
+    def schedule(self, tenant):
+        # overlapping requests for the same tenant share the in-flight run
+        with self.lock:
+            name = tenant['name']
+            future = self.running.get(name)
+            if future is None:
+                status = self.tenants.setdefault(name, dict(last_run=None, last_success=None, last_duration=None, last_added=None, last_error=None))
+                status["scheduled"] = time.monotonic()
+                future = self.executor.submit(self.run_tenant, tenant)
+                self.running[name] = future
+            return future
+
+    def submit(self, names: list = None) -> str:
+        tenants = [t for t in Config.instance().getTenants() if names is None or t['name'] in names]
+        job_id = uuid.uuid4().hex[:12]
+        futures = {t['name']: self.schedule(t) for t in tenants}
+        with self.lock:
+            self.jobs[job_id] = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "futures": futures}
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        return job_id
+
+    def wait(self, job_id: str, timeout: float = None) -> dict:
+        futures = self.jobs[job_id]["futures"]
+        (_, pending) = wait(futures.values(), timeout=timeout)
+        results = dict()
+        for name, future in futures.items():
+            if future in pending:
+                logger.error("Refreshing %s timed out after %ds" % (name, timeout))
+                Metrics.instance().inc("refresh_total", tenant=name, result="timeout")
+                results[name] = TimeoutError("refresh timed out after %ds" % timeout)
+            elif future.exception() is not None:
+                results[name] = future.exception()
+            else:
+                results[name] = future.result()
+        return results
+
+    def state(self, future) -> dict:
+        if not future.done():
+            return {"state": "running" if future.running() else "queued"}
+        if future.cancelled():
+            return {"state": "cancelled"}
+        if future.exception() is not None:
+            return {"state": "failed", "error": str(future.exception())}
+        return {"state": "done", "added": future.result()}
+
+    def status(self, job_id: str = None) -> dict:
+        if job_id is not None:
+            if not job_id in self.jobs:
+                return None
+            job = self.jobs[job_id]
+            tenants = {name: self.state(future) for name, future in job["futures"].items()}
+            done = all(future.done() for future in job["futures"].values())
+            return {"job": job_id, "created": job["created"], "done": done, "tenants": tenants}
+
+        tenants = dict()
+        for name, status in self.tenants.items():
+            tenants[name] = {k: v for k, v in status.items() if k != "scheduled"}
+            tenants[name]["running"] = name in self.running
+        jobs = [self.status(job_id) for job_id in reversed(self.jobs.keys())][:10]
+        return {"tenants": tenants, "jobs": jobs}
+
+    def start(self, tick: float = 10):
+        if self.thread is not None:
+            return
+        if not any(self.interval(t) for t in Config.instance().getTenants()):
+            logger.info("background sync disabled (no refresh_interval configured)")
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.loop, args=(tick,), name="sync", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def loop(self, tick: float):
+        # first pass runs right away, later passes every tick seconds
+        while True:
+            for tenant in Config.instance().getTenants():
+                interval = self.interval(tenant)
+                if not interval:
+                    continue
+                scheduled = self.tenants.get(tenant['name'], dict()).get("scheduled")
+                if scheduled is None or time.monotonic() - scheduled >= interval:
+                    self.schedule(tenant)
+            if self.stopping.wait(tick):
+                return